@@ -1,9 +1,90 @@
+import bisect
+import hashlib
+import io
 import json
 import os
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+from contextlib import contextmanager
+from contextvars import ContextVar
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import Json, RealDictCursor, execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+
+import tally
+
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '5'))
+DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '5'))
+
+ELECTION_STATUSES = ('scheduled', 'registration', 'voting', 'completed', 'failed')
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+ACTIVE_ELECTION_CACHE_TTL = float(os.environ.get('ACTIVE_ELECTION_CACHE_TTL', '30'))
+RENDERED_LIST_CACHE_TTL = float(os.environ.get('RENDERED_LIST_CACHE_TTL', '30'))
+RENDERED_LIST_CACHE_SIZE = 1024
+CANDIDATE_INDEX_TTL = float(os.environ.get('CANDIDATE_INDEX_TTL', '60'))
+AUTOCOMPLETE_MAX_CHOICES = 25
+EMBED_TITLE_LIMIT = 256
+EMBED_DESCRIPTION_LIMIT = 4096
+SERVER_REFRESH_INTERVAL = float(os.environ.get('SERVER_REFRESH_INTERVAL', '3600'))
+TALLY_COMPACT_THRESHOLD = int(os.environ.get('TALLY_COMPACT_THRESHOLD', '1000'))
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', '10000'))
+BULK_PAGE_SIZE = 1000
+SCHEDULER_BATCH_SIZE = int(os.environ.get('SCHEDULER_BATCH_SIZE', '500'))
+SCHEDULER_LEASE_SECONDS = float(os.environ.get('SCHEDULER_LEASE_SECONDS', '300'))
+ELECTION_CHANGES_RETENTION_HOURS = float(os.environ.get('ELECTION_CHANGES_RETENTION_HOURS', '72'))
+ELECTION_CHANGES_PRUNE_BATCH = int(os.environ.get('ELECTION_CHANGES_PRUNE_BATCH', '10000'))
+
+DISCORD_API_BASE = os.environ.get('DISCORD_API_BASE', 'https://discord.com/api/v10')
+DISCORD_DEFER_MODE = os.environ.get('DISCORD_DEFER_MODE', 'off')
+DISCORD_DEFER_BUDGET_MS = float(os.environ.get('DISCORD_DEFER_BUDGET_MS', '1500'))
+DISCORD_COLD_START_MS = float(os.environ.get('DISCORD_COLD_START_MS', '1000'))
+DISCORD_FOLLOWUP_WORKERS = int(os.environ.get('DISCORD_FOLLOWUP_WORKERS', '4'))
+DISCORD_MAX_REQUEST_AGE = float(os.environ.get('DISCORD_MAX_REQUEST_AGE', '300'))
+DISCORD_DEDUP_STORE = os.environ.get('DISCORD_DEDUP_STORE', 'memory')
+DISCORD_DEDUP_CACHE_SIZE = int(os.environ.get('DISCORD_DEDUP_CACHE_SIZE', '10000'))
+
+VOTE_BATCH_WINDOW_MS = float(os.environ.get('VOTE_BATCH_WINDOW_MS', '0'))
+VOTE_BATCH_MAX_SIZE = int(os.environ.get('VOTE_BATCH_MAX_SIZE', '500'))
+
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0'))
+TRACE_MAX_STATEMENTS = 20
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+HISTOGRAM_MAX_SERIES = 100
+
+_db_pool = None
+_db_pool_size = DB_POOL_MAX
+_db_pool_lock = threading.Lock()
+_db_conn_last_used: Dict[int, float] = {}
+_db_conn_failed_at = 0.0
+_active_elections_cache: Dict[str, tuple] = {}
+_rendered_lists: Dict[str, tuple] = {}
+_candidate_indexes: Dict[str, tuple] = {}
+_election_role_sets: Dict[tuple, tuple] = {}
+_known_guilds: Dict[str, tuple] = {}
+_command_latency_ms: Dict[str, float] = {}
+_followup_executor = None
+_vote_batcher = None
+_vote_batcher_lock = threading.Lock()
+_current_trace: ContextVar = ContextVar('current_trace', default=None)
+_traced_cursor_classes: Dict[type, type] = {}
+_histograms: Dict[str, Dict[str, Any]] = {}
+_histograms_lock = threading.Lock()
+_verify_keys: Dict[str, VerifyKey] = {}
+_resolved_api_paths: Dict[str, Any] = {}
+_processed_interactions: OrderedDict = OrderedDict()
+_processed_interactions_lock = threading.Lock()
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -16,16 +97,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     if method == 'OPTIONS':
         return cors_response()
     
+    trace = start_trace()
+    try:
+        response = dispatch_request(event)
+    finally:
+        _current_trace.set(None)
+    return finish_trace(trace, response)
+
+def dispatch_request(event: Dict[str, Any]) -> Dict[str, Any]:
     headers = event.get('headers', {})
     headers_lower = {k.lower(): v for k, v in headers.items()}
     
-    print(f"Request: method={method}, headers={list(headers_lower.keys())[:5]}")
-    
     if 'x-signature-ed25519' in headers_lower or 'x-signature-timestamp' in headers_lower:
-        print("Detected Discord request")
         return handle_discord_interaction(event)
     else:
-        print("Detected API request")
         return handle_api_request(event)
 
 def cors_response():
@@ -34,7 +119,7 @@ def cors_response():
         'headers': {
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type, X-Signature-Ed25519, X-Signature-Timestamp, X-User-Id',
+            'Access-Control-Allow-Headers': 'Content-Type, X-Signature-Ed25519, X-Signature-Timestamp, X-User-Id, If-None-Match',
             'Access-Control-Max-Age': '86400'
         },
         'body': '',
@@ -44,97 +129,302 @@ def cors_response():
 def handle_discord_interaction(event: Dict[str, Any]) -> Dict[str, Any]:
     headers = event.get('headers', {})
     body_str = event.get('body', '{}')
-    
-    print(f"All headers: {headers}")
-    
     headers_lower = {k.lower(): v for k, v in headers.items()}
     
     signature = headers_lower.get('x-signature-ed25519', '')
     timestamp = headers_lower.get('x-signature-timestamp', '')
     public_key = os.environ.get('DISCORD_PUBLIC_KEY', '')
     
-    print(f"Discord verification: sig={signature[:20] if signature else 'MISSING'}..., ts={timestamp if timestamp else 'MISSING'}, key={public_key[:20]}...")
+    set_trace_name('discord')
     
     if not signature or not timestamp:
-        print(f"Missing Discord headers!")
         return create_json_response({'error': 'Missing signature headers'}, 401)
     
-    if not verify_discord_signature(body_str, signature, timestamp, public_key):
-        print(f"Verification failed!")
+    with trace_span('verify'):
+        verified = verify_discord_signature(body_str, signature, timestamp, public_key)
+    if not verified:
         return create_json_response({'error': 'Invalid signature'}, 401)
+    if not is_fresh_timestamp(timestamp):
+        return create_json_response({'error': 'Stale request'}, 401)
     
     body = json.loads(body_str)
     interaction_type = body.get('type', 0)
     
     if interaction_type == 1:
+        set_trace_name('discord:ping')
         return create_json_response({'type': 1})
     
     if interaction_type == 2:
-        return handle_discord_command(body)
+        return process_interaction_once(body, handle_discord_command)
+    
+    if interaction_type == 3:
+        return process_interaction_once(body, handle_discord_component)
+    
+    if interaction_type == 4:
+        return handle_discord_autocomplete(body)
     
     return create_json_response({'error': 'Unknown interaction'}, 400)
 
+def is_fresh_timestamp(timestamp: str) -> bool:
+    try:
+        return abs(time.time() - int(timestamp)) <= DISCORD_MAX_REQUEST_AGE
+    except ValueError:
+        return False
+
+def process_interaction_once(interaction: Dict[str, Any], process) -> Dict[str, Any]:
+    '''
+    Повторная доставка того же interaction id отдаёт сохранённый ответ, не касаясь
+    таблиц выборов. Пока первая доставка обрабатывается, повтор получает заглушку.
+    '''
+    interaction_id = interaction.get('id')
+    if not interaction_id:
+        return process(interaction)
+    
+    with _processed_interactions_lock:
+        known = interaction_id in _processed_interactions
+        cached = _processed_interactions.get(interaction_id)
+        if known:
+            _processed_interactions.move_to_end(interaction_id)
+        else:
+            _processed_interactions[interaction_id] = None
+            while len(_processed_interactions) > DISCORD_DEDUP_CACHE_SIZE:
+                _processed_interactions.popitem(last=False)
+    
+    if not known and DISCORD_DEDUP_STORE == 'postgres':
+        try:
+            known, cached = claim_interaction(interaction_id)
+        except (psycopg2.Error, PoolError) as e:
+            print(f"Interaction dedup claim failed: {e}")
+        if known:
+            with _processed_interactions_lock:
+                if cached is None:
+                    _processed_interactions.pop(interaction_id, None)
+                else:
+                    _processed_interactions[interaction_id] = cached
+    
+    if known:
+        set_trace_name('discord:replay')
+        if cached is None:
+            return discord_response('⏳ Команда уже обрабатывается', ephemeral=True)
+        return dict(cached, headers=dict(cached['headers']))
+    
+    try:
+        response = process(interaction)
+    except Exception:
+        forget_interaction(interaction_id)
+        raise
+    
+    response = dict(response, headers=dict(response['headers']))
+    with _processed_interactions_lock:
+        if interaction_id in _processed_interactions:
+            _processed_interactions[interaction_id] = response
+    if DISCORD_DEDUP_STORE == 'postgres':
+        store_interaction_response(interaction_id, response)
+    return dict(response, headers=dict(response['headers']))
+
+def forget_interaction(interaction_id: str):
+    with _processed_interactions_lock:
+        _processed_interactions.pop(interaction_id, None)
+    if DISCORD_DEDUP_STORE == 'postgres':
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM processed_interactions WHERE id = %s AND response IS NULL", (interaction_id,))
+                conn.commit()
+                cursor.close()
+        except (psycopg2.Error, PoolError) as e:
+            print(f"Interaction dedup cleanup failed: {e}")
+
+def claim_interaction(interaction_id: str) -> tuple:
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            WITH claimed AS (
+                INSERT INTO processed_interactions (id) VALUES (%s)
+                ON CONFLICT (id) DO NOTHING
+                RETURNING id
+            )
+            SELECT EXISTS (SELECT 1 FROM claimed), (SELECT response FROM processed_interactions WHERE id = %s)
+            """,
+            (interaction_id, interaction_id)
+        )
+        claimed, response = cursor.fetchone()
+        if claimed and random.random() < 0.01:
+            cursor.execute(
+                "DELETE FROM processed_interactions WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)",
+                (DISCORD_MAX_REQUEST_AGE * 2,)
+            )
+        conn.commit()
+        cursor.close()
+    return not claimed, response
+
+def store_interaction_response(interaction_id: str, response: Dict[str, Any]):
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE processed_interactions SET response = %s WHERE id = %s", (Json(response), interaction_id))
+            conn.commit()
+            cursor.close()
+    except (psycopg2.Error, PoolError) as e:
+        print(f"Interaction dedup store failed: {e}")
+
+def get_verify_key(public_key: str):
+    verify_key = _verify_keys.get(public_key)
+    if verify_key is None and public_key:
+        try:
+            verify_key = VerifyKey(bytes.fromhex(public_key))
+        except Exception as e:
+            print(f"Invalid DISCORD_PUBLIC_KEY: {e}")
+            return None
+        _verify_keys[public_key] = verify_key
+    return verify_key
+
 def verify_discord_signature(body: str, signature: str, timestamp: str, public_key: str) -> bool:
+    verify_key = get_verify_key(public_key)
+    if verify_key is None:
+        return False
+    
     try:
-        from nacl.signing import VerifyKey
-        verify_key = VerifyKey(bytes.fromhex(public_key))
-        message = timestamp.encode() + body.encode()
-        verify_key.verify(message, bytes.fromhex(signature))
+        verify_key.verify(timestamp.encode() + body.encode(), bytes.fromhex(signature))
         return True
-    except Exception as e:
+    except (BadSignatureError, ValueError) as e:
         print(f"Signature verification error: {e}")
         return False
 
 def handle_discord_command(interaction: Dict[str, Any]) -> Dict[str, Any]:
+    set_trace_name(f"discord:{discord_command_key(interaction)}")
+    
+    if should_defer_command(interaction):
+        get_followup_executor().submit(complete_deferred_command, interaction)
+        return create_json_response({'type': 5})
+    
+    return run_discord_command(interaction)
+
+def discord_command_key(interaction: Dict[str, Any]) -> str:
+    data = interaction.get('data', {})
+    options = data.get('options') or [{}]
+    return f"{data.get('name', '')}:{options[0].get('name', '')}"
+
+def should_defer_command(interaction: Dict[str, Any]) -> bool:
+    if DISCORD_DEFER_MODE == 'off' or not interaction.get('guild_id') or not interaction.get('token'):
+        return False
+    if DISCORD_DEFER_MODE == 'always':
+        return True
+    
+    estimate_ms = _command_latency_ms.get(discord_command_key(interaction), 0.0)
+    if _db_pool is None:
+        estimate_ms += DISCORD_COLD_START_MS
+    return estimate_ms > DISCORD_DEFER_BUDGET_MS
+
+def record_command_latency(key: str, elapsed_ms: float):
+    previous = _command_latency_ms.get(key)
+    _command_latency_ms[key] = elapsed_ms if previous is None else previous * 0.8 + elapsed_ms * 0.2
+
+def get_followup_executor():
+    global _followup_executor
+    if _followup_executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _followup_executor = ThreadPoolExecutor(max_workers=DISCORD_FOLLOWUP_WORKERS, thread_name_prefix='discord-followup')
+    return _followup_executor
+
+def shutdown_followup_executor():
+    '''Дожидается отправки начатых отложенных ответов; следующий вызов get_followup_executor создаст новый пул.'''
+    global _followup_executor
+    if _followup_executor is not None:
+        _followup_executor.shutdown(wait=True)
+        _followup_executor = None
+
+def complete_deferred_command(interaction: Dict[str, Any]):
+    try:
+        result = run_discord_command(interaction)
+        message = json.loads(result['body']).get('data', {})
+    except Exception as e:
+        print(f"Deferred command failed: {e}")
+        message = {'content': '❌ Не удалось выполнить команду', 'flags': 64}
+    
+    application_id = interaction.get('application_id', '')
+    token = interaction['token']
+    if message.get('flags', 0) & 64:
+        # Видимость отложенного ответа задана публичным ACK: ephemeral-ответ уходит отдельным
+        # follow-up с flags 64, а публичная заглушка «думает…» удаляется
+        discord_webhook_request('POST', f"/webhooks/{application_id}/{token}", message)
+        discord_webhook_request('DELETE', f"/webhooks/{application_id}/{token}/messages/@original")
+    else:
+        discord_webhook_request('PATCH', f"/webhooks/{application_id}/{token}/messages/@original", message)
+
+def discord_webhook_request(method: str, path: str, message: Dict = None):
+    import urllib.request
+    
+    req = urllib.request.Request(
+        f"{DISCORD_API_BASE}{path}",
+        data=json.dumps(message).encode('utf-8') if message is not None else None,
+        headers={'Content-Type': 'application/json'},
+        method=method
+    )
+    
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            response.read()
+    except Exception as e:
+        print(f"Follow-up delivery failed: {e}")
+
+def run_discord_command(interaction: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
     data = interaction.get('data', {})
     command_name = data.get('name', '')
     guild_id = interaction.get('guild_id', '')
     user = interaction.get('member', {}).get('user', {})
     user_id = user.get('id', '')
     user_name = user.get('username', 'Unknown')
+    member_roles = interaction.get('member', {}).get('roles', [])
     
     if not guild_id:
         return discord_response('Команда доступна только на серверах!', ephemeral=True)
     
-    conn = get_db_connection()
-    ensure_server_exists(conn, guild_id, interaction.get('guild', {}).get('name', 'Unknown'))
+    guild_name = interaction.get('guild', {}).get('name', 'Unknown')
     
-    if command_name == 'vote':
-        options = data.get('options', [{}])[0]
-        subcommand = options.get('name', '')
+    def run(conn):
+        server_upserted = ensure_server_exists(conn, guild_id, guild_name)
         
-        if subcommand == 'info':
-            result = discord_info(conn, guild_id)
-        elif subcommand == 'register':
-            result = discord_register(conn, guild_id, user_id, user_name, options)
-        elif subcommand == 'withdraw':
-            result = discord_withdraw(conn, guild_id, user_id)
-        elif subcommand == 'cast':
-            result = discord_cast(conn, guild_id, user_id, user_name, options)
-        elif subcommand == 'list':
-            result = discord_list(conn, guild_id)
+        if command_name == 'vote':
+            options = data.get('options', [{}])[0]
+            subcommand = options.get('name', '')
+            
+            if subcommand == 'info':
+                result = discord_info(conn, guild_id)
+            elif subcommand == 'register':
+                result = discord_register(conn, guild_id, user_id, user_name, options, member_roles)
+            elif subcommand == 'withdraw':
+                result = discord_withdraw(conn, guild_id, user_id)
+            elif subcommand == 'cast':
+                result = discord_cast(conn, guild_id, user_id, user_name, options, member_roles)
+            elif subcommand == 'list':
+                result = discord_list(conn, guild_id)
+            else:
+                result = discord_response('Неизвестная подкоманда', ephemeral=True)
         else:
-            result = discord_response('Неизвестная подкоманда', ephemeral=True)
-    else:
-        result = discord_response('Неизвестная команда', ephemeral=True)
+            result = discord_response('Неизвестная команда', ephemeral=True)
+        
+        if server_upserted:
+            conn.commit()
+            remember_guild(guild_id, guild_name)
+        return result
     
-    conn.close()
+    result = with_db_connection(run)
+    record_command_latency(discord_command_key(interaction), (time.perf_counter() - started) * 1000)
     return result
 
 def discord_info(conn, guild_id: str):
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute(
-        "SELECT * FROM elections WHERE server_id = %s AND status IN ('registration', 'voting') ORDER BY created_at DESC LIMIT 1",
-        (guild_id,)
-    )
-    election = cursor.fetchone()
+    election = find_active_election(conn, guild_id, ('registration', 'voting'))
     
     if not election:
-        cursor.close()
         return discord_response('На данный момент нет активных выборов', ephemeral=True)
     
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute("SELECT COUNT(*) as count FROM candidates WHERE election_id = %s", (election['id'],))
     candidate_count = cursor.fetchone()['count']
+    total_votes = sum(fetch_vote_tallies(conn, [election['id']]).get(election['id'], {}).values())
     
     status_text = {'registration': '📝 Регистрация кандидатов', 'voting': '🗳️ Голосование'}.get(election['status'], election['status'])
     required_votes = int(election['server_member_count'] * election['min_votes_threshold_percent'] / 100)
@@ -146,25 +436,23 @@ def discord_info(conn, guild_id: str):
         'fields': [
             {'name': 'Статус', 'value': status_text, 'inline': True},
             {'name': 'Кандидатов', 'value': str(candidate_count), 'inline': True},
-            {'name': 'Голосов', 'value': f"{election['total_votes']}/{required_votes}", 'inline': True}
+            {'name': 'Голосов', 'value': f"{total_votes}/{required_votes}", 'inline': True}
         ]
     }
     
     cursor.close()
     return discord_response('', embeds=[embed])
 
-def discord_register(conn, guild_id: str, user_id: str, user_name: str, options: Dict):
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute(
-        "SELECT * FROM elections WHERE server_id = %s AND status = 'registration' ORDER BY created_at DESC LIMIT 1",
-        (guild_id,)
-    )
-    election = cursor.fetchone()
+def discord_register(conn, guild_id: str, user_id: str, user_name: str, options: Dict, member_roles: List[str] = ()):
+    election = find_active_election(conn, guild_id, ('registration',))
     
     if not election:
-        cursor.close()
         return discord_response('❌ Сейчас не проводится регистрация', ephemeral=True)
     
+    if not has_required_role(get_election_role_sets(election)[0], member_roles):
+        return discord_response('❌ У вас нет роли, необходимой для выдвижения кандидатуры', ephemeral=True)
+    
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute("SELECT * FROM candidates WHERE election_id = %s AND user_id = %s", (election['id'], user_id))
     if cursor.fetchone():
         cursor.close()
@@ -179,26 +467,42 @@ def discord_register(conn, guild_id: str, user_id: str, user_name: str, options:
     
     candidate_id = f"{election['id']}_{user_id}"
     cursor.execute(
-        "INSERT INTO candidates (id, election_id, user_id, user_name, speech) VALUES (%s, %s, %s, %s, %s)",
-        (candidate_id, election['id'], user_id, user_name, speech)
+        """
+        INSERT INTO candidates (id, election_id, user_id, user_name, speech)
+        SELECT %s, id, %s, %s, %s FROM elections WHERE id = %s AND status = 'registration'
+        FOR NO KEY UPDATE
+        ON CONFLICT (election_id, user_id) DO NOTHING
+        """,
+        (candidate_id, user_id, user_name, speech, election['id'])
     )
+    registered = cursor.rowcount
+    if registered:
+        record_change(cursor, election['id'], 'candidate_registered', {'candidateId': candidate_id, 'userId': user_id, 'userName': user_name})
+    else:
+        # Параллельная регистрация того же пользователя успела раньше
+        cursor.execute("SELECT 1 FROM candidates WHERE election_id = %s AND user_id = %s", (election['id'], user_id))
+        if cursor.fetchone():
+            conn.rollback()
+            cursor.close()
+            return discord_response('❌ Вы уже зарегистрированы', ephemeral=True)
     conn.commit()
     cursor.close()
     
+    if not registered:
+        invalidate_active_elections(guild_id)
+        return discord_response('❌ Сейчас не проводится регистрация', ephemeral=True)
+    
+    invalidate_rendered_list(election['id'])
+    invalidate_candidate_index(election['id'])
     return discord_response(f'✅ Вы зарегистрированы как кандидат в "{election["title"]}"')
 
 def discord_withdraw(conn, guild_id: str, user_id: str):
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute(
-        "SELECT * FROM elections WHERE server_id = %s AND status = 'registration' ORDER BY created_at DESC LIMIT 1",
-        (guild_id,)
-    )
-    election = cursor.fetchone()
+    election = find_active_election(conn, guild_id, ('registration',))
     
     if not election:
-        cursor.close()
         return discord_response('❌ Сейчас не проводится регистрация', ephemeral=True)
     
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute("SELECT * FROM candidates WHERE election_id = %s AND user_id = %s", (election['id'], user_id))
     candidate = cursor.fetchone()
     
@@ -206,101 +510,539 @@ def discord_withdraw(conn, guild_id: str, user_id: str):
         cursor.close()
         return discord_response('❌ Вы не зарегистрированы', ephemeral=True)
     
-    cursor.execute("DELETE FROM candidates WHERE id = %s", (candidate['id'],))
+    # Кэш выборов может отставать: снять кандидатуру можно, только пока регистрация действительно идёт
+    cursor.execute(
+        """
+        DELETE FROM candidates WHERE id = %s
+        AND election_id IN (SELECT id FROM elections WHERE id = %s AND status = 'registration' FOR NO KEY UPDATE)
+        """,
+        (candidate['id'], election['id'])
+    )
+    withdrawn = cursor.rowcount
+    if withdrawn:
+        record_change(cursor, election['id'], 'candidate_withdrawn', {'candidateId': candidate['id'], 'userId': user_id})
     conn.commit()
     cursor.close()
     
+    if not withdrawn:
+        invalidate_active_elections(guild_id)
+        return discord_response('❌ Сейчас не проводится регистрация', ephemeral=True)
+    
+    invalidate_rendered_list(election['id'])
+    invalidate_candidate_index(election['id'])
+    
     return discord_response('✅ Вы сняли свою кандидатуру')
 
-def discord_cast(conn, guild_id: str, user_id: str, user_name: str, options: Dict):
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute(
-        "SELECT * FROM elections WHERE server_id = %s AND status = 'voting' ORDER BY created_at DESC LIMIT 1",
-        (guild_id,)
-    )
-    election = cursor.fetchone()
+def discord_cast(conn, guild_id: str, user_id: str, user_name: str, options: Dict, member_roles: List[str] = ()):
+    candidate_option = next((opt for opt in options.get('options', []) if opt.get('name') == 'candidate'), None)
+    if not candidate_option:
+        return discord_response('❌ Необходимо указать кандидата', ephemeral=True)
+    
+    election = find_active_election(conn, guild_id, ('voting',))
     
     if not election:
-        cursor.close()
         return discord_response('❌ Сейчас не проводится голосование', ephemeral=True)
     
-    cursor.execute("SELECT * FROM votes WHERE election_id = %s AND user_id = %s", (election['id'], user_id))
-    if cursor.fetchone():
-        cursor.close()
-        return discord_response('❌ Вы уже проголосовали', ephemeral=True)
-    
-    candidate_option = next((opt for opt in options.get('options', []) if opt.get('name') == 'candidate'), None)
-    if not candidate_option:
-        cursor.close()
-        return discord_response('❌ Необходимо указать кандидата', ephemeral=True)
+    if not has_required_role(get_election_role_sets(election)[1], member_roles):
+        return discord_response('❌ У вас нет роли, необходимой для голосования', ephemeral=True)
     
-    candidate_user_id = candidate_option.get('value', '')
+    candidate_user_id = resolve_candidate(get_candidate_index(conn, election['id']), str(candidate_option.get('value', '')))
     
+    if not candidate_user_id:
+        return discord_response('❌ Кандидат не найден', ephemeral=True)
     if candidate_user_id == user_id:
-        cursor.close()
         return discord_response('❌ Вы не можете голосовать за себя', ephemeral=True)
     
-    cursor.execute("SELECT * FROM candidates WHERE election_id = %s AND user_id = %s", (election['id'], candidate_user_id))
-    candidate = cursor.fetchone()
+    outcome = cast_vote(conn, user_id, user_name, election_id=election['id'], candidate_user_id=candidate_user_id)
     
-    if not candidate:
-        cursor.close()
+    if outcome['status'] == 'no_election':
+        return discord_response('❌ Сейчас не проводится голосование', ephemeral=True)
+    if outcome['status'] == 'duplicate':
+        return discord_response('❌ Вы уже проголосовали', ephemeral=True)
+    if outcome['status'] == 'no_candidate':
         return discord_response('❌ Кандидат не найден', ephemeral=True)
     
-    cursor.execute(
-        "INSERT INTO votes (election_id, user_id, user_name, candidate_id) VALUES (%s, %s, %s, %s)",
-        (election['id'], user_id, user_name, candidate['id'])
+    return discord_response(f'✅ Ваш голос учтён! Вы проголосовали за {outcome["candidate_name"]}')
+
+CAST_VOTES_SQL = """
+    WITH incoming (seq, election_id, guild_id, candidate_id, candidate_user_id, user_id, user_name, ranking) AS (VALUES %s),
+    resolved AS (
+        SELECT i.seq, i.user_id, i.user_name, e.id AS election_id, c.id AS candidate_id, c.user_name AS candidate_name,
+               rk.ranking, i.ranking IS NULL OR COALESCE(rk.complete, FALSE) AS ranking_valid
+        FROM incoming i
+        LEFT JOIN LATERAL (
+            SELECT id FROM elections
+            WHERE status = 'voting'
+              AND (i.guild_id IS NULL OR server_id = i.guild_id)
+              AND (i.election_id IS NULL OR id = i.election_id)
+            ORDER BY created_at DESC LIMIT 1
+        ) e ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT id, user_name FROM candidates
+            WHERE election_id = e.id AND (id = i.candidate_id OR user_id = i.candidate_user_id)
+            LIMIT 1
+        ) c ON TRUE
+        LEFT JOIN LATERAL (
+            -- Бюллетень принимается целиком или не принимается: неизвестный кандидат, кандидат
+            -- без номера или повтор делают его недействительным, а не укорачивают
+            SELECT array_agg(rc.ballot_index ORDER BY r.ord) AS ranking,
+                   COUNT(DISTINCT rc.ballot_index) = COUNT(*) AND (array_agg(rc.id ORDER BY r.ord))[1] = c.id AS complete
+            FROM unnest(i.ranking) WITH ORDINALITY AS r (candidate_id, ord)
+            LEFT JOIN candidates rc ON rc.election_id = e.id AND rc.id = r.candidate_id
+        ) rk ON i.ranking IS NOT NULL
+    ),
+    chosen AS (
+        SELECT DISTINCT ON (election_id, user_id) seq, election_id, user_id, user_name, candidate_id, ranking
+        FROM resolved WHERE candidate_id IS NOT NULL AND ranking_valid
+        ORDER BY election_id, user_id, seq
+    ),
+    inserted AS (
+        INSERT INTO votes (election_id, user_id, user_name, candidate_id, ranking)
+        SELECT election_id, user_id, user_name, candidate_id, ranking FROM chosen
+        ON CONFLICT (election_id, user_id) DO NOTHING
+        RETURNING election_id, user_id, candidate_id
+    ),
+    logged AS (
+        INSERT INTO election_changes (server_id, election_id, kind, payload)
+        SELECT e.server_id, ins.election_id, 'vote', jsonb_build_object('candidateId', ins.candidate_id)
+        FROM inserted ins JOIN elections e ON e.id = ins.election_id
+    )
+    SELECT r.seq, r.election_id, r.candidate_name, r.ranking_valid,
+           COALESCE(ch.seq = r.seq AND ins.user_id IS NOT NULL, FALSE) AS accepted
+    FROM resolved r
+    LEFT JOIN chosen ch ON ch.election_id = r.election_id AND ch.user_id = r.user_id
+    LEFT JOIN inserted ins ON ins.election_id = r.election_id AND ins.user_id = r.user_id
+    ORDER BY r.seq
+"""
+
+CAST_VOTES_TEMPLATE = "(%s::int, %s::text, %s::text, %s::text, %s::text, %s::text, %s::text, %s::text[])"
+
+def cast_votes(conn, ballots: List[Dict]) -> List[Dict[str, Any]]:
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    rows = execute_values(
+        cursor, CAST_VOTES_SQL,
+        [
+            (seq, b.get('election_id'), b.get('guild_id'), b.get('candidate_id'),
+             b.get('candidate_user_id'), b['user_id'], b['user_name'], b.get('ranking'))
+            for seq, b in enumerate(ballots)
+        ],
+        template=CAST_VOTES_TEMPLATE, page_size=max(len(ballots), 1), fetch=True
     )
-    cursor.execute("UPDATE candidates SET votes = votes + 1 WHERE id = %s", (candidate['id'],))
-    cursor.execute("UPDATE elections SET total_votes = total_votes + 1 WHERE id = %s", (election['id'],))
-    conn.commit()
     cursor.close()
     
-    return discord_response(f'✅ Ваш голос учтён! Вы проголосовали за {candidate["user_name"]}')
+    outcomes = []
+    for row in rows:
+        if not row['election_id']:
+            status = 'no_election'
+        elif not row['candidate_name']:
+            status = 'no_candidate'
+        elif not row['ranking_valid']:
+            status = 'invalid_ranking'
+        elif not row['accepted']:
+            status = 'duplicate'
+        else:
+            status = 'accepted'
+        outcomes.append({'status': status, 'election_id': row['election_id'], 'candidate_name': row['candidate_name']})
+    return outcomes
 
-def discord_list(conn, guild_id: str):
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute(
-        "SELECT * FROM elections WHERE server_id = %s AND status IN ('registration', 'voting') ORDER BY created_at DESC LIMIT 1",
-        (guild_id,)
+def cast_vote(conn, user_id: str, user_name: str, guild_id: str = None, election_id: str = None,
+              candidate_id: str = None, candidate_user_id: str = None, ranking: List[str] = None) -> Dict[str, Any]:
+    ballot = {
+        'guild_id': guild_id,
+        'election_id': election_id,
+        'candidate_id': candidate_id,
+        'candidate_user_id': candidate_user_id,
+        'user_id': user_id,
+        'user_name': user_name,
+        'ranking': ranking
+    }
+    
+    if VOTE_BATCH_WINDOW_MS > 0:
+        outcome = get_vote_batcher().submit(conn, ballot)
+    else:
+        outcome = cast_votes(conn, [ballot])[0]
+        conn.commit()
+    
+    if outcome['status'] == 'accepted':
+        invalidate_rendered_list(outcome['election_id'])
+    return outcome
+
+class VoteBatcher:
+    '''
+    Собирает голоса из параллельных запросов в течение короткого окна и
+    записывает их одним многострочным INSERT. Первый голос в окне делает
+    запись на своём соединении, остальные ждут результата.
+    '''
+    
+    def __init__(self, window_ms: float, max_size: int):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._full = threading.Condition(self._lock)
+        self._pending: List[Dict] = []
+    
+    def submit(self, conn, ballot: Dict) -> Dict[str, Any]:
+        slot = {'ballot': ballot, 'done': threading.Event(), 'result': None, 'error': None}
+        
+        with self._lock:
+            self._pending.append(slot)
+            leader = len(self._pending) == 1
+            if len(self._pending) >= self.max_size:
+                self._full.notify()
+        
+        if leader:
+            with self._lock:
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._full.wait(remaining)
+                batch, self._pending = self._pending, []
+            self._flush(conn, batch)
+        
+        slot['done'].wait()
+        if slot['error']:
+            raise slot['error']
+        return slot['result']
+    
+    def _flush(self, conn, batch: List[Dict]):
+        try:
+            outcomes = cast_votes(conn, [slot['ballot'] for slot in batch])
+            conn.commit()
+            for slot, outcome in zip(batch, outcomes):
+                slot['result'] = outcome
+        except Exception as e:
+            conn.rollback()
+            for slot in batch:
+                slot['error'] = e
+        finally:
+            for slot in batch:
+                slot['done'].set()
+
+def get_vote_batcher() -> VoteBatcher:
+    global _vote_batcher
+    if _vote_batcher is None:
+        with _vote_batcher_lock:
+            if _vote_batcher is None:
+                _vote_batcher = VoteBatcher(VOTE_BATCH_WINDOW_MS, VOTE_BATCH_MAX_SIZE)
+    return _vote_batcher
+
+VOTE_TALLIES_SQL = """
+    SELECT election_id, candidate_id, SUM(votes)::int AS votes FROM (
+        SELECT election_id, candidate_id, votes FROM vote_tallies
+        WHERE election_id = ANY(%(ids)s)
+        UNION ALL
+        SELECT election_id, candidate_id, COUNT(*) FROM votes
+        WHERE election_id = ANY(%(ids)s) AND NOT tallied
+        GROUP BY election_id, candidate_id
+    ) t
+    GROUP BY election_id, candidate_id
+"""
+
+COMPACT_VOTE_TALLIES_SQL = """
+    WITH backlog AS (
+        SELECT election_id AS id FROM votes WHERE NOT tallied
+        GROUP BY election_id HAVING COUNT(*) >= %(threshold)s
+    ),
+    locked AS (
+        SELECT id FROM backlog WHERE pg_try_advisory_xact_lock(hashtext('vote_tallies:' || id))
+    ),
+    folded AS (
+        UPDATE votes SET tallied = TRUE
+        WHERE election_id IN (SELECT id FROM locked) AND NOT tallied
+        RETURNING election_id, candidate_id
+    ),
+    upserted AS (
+        INSERT INTO vote_tallies (election_id, candidate_id, votes)
+        SELECT election_id, candidate_id, COUNT(*) FROM folded GROUP BY election_id, candidate_id
+        ON CONFLICT (election_id, candidate_id) DO UPDATE SET votes = vote_tallies.votes + EXCLUDED.votes
     )
-    election = cursor.fetchone()
+    SELECT COUNT(*) FROM folded
+"""
+
+def fetch_vote_tallies(conn, election_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    '''
+    Итоги = свёрнутые строки vote_tallies + ещё не свёрнутые голоса из votes,
+    одним запросом. Чтение ничего не пишет: свёртку делает тик планировщика.
+    '''
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(VOTE_TALLIES_SQL, {'ids': list(election_ids)})
+    rows = cursor.fetchall()
+    cursor.close()
+    
+    tallies: Dict[str, Dict[str, int]] = {}
+    for row in rows:
+        tallies.setdefault(row['election_id'], {})[row['candidate_id']] = row['votes']
+    return tallies
+
+def compact_vote_tallies(conn) -> int:
+    '''
+    Свёртка в vote_tallies голосов выборов, у которых несвёрнутых набралось не меньше
+    TALLY_COMPACT_THRESHOLD. Выборы, которые уже сворачивает параллельный тик, пропускаются.
+    '''
+    cursor = conn.cursor()
+    cursor.execute(COMPACT_VOTE_TALLIES_SQL, {'threshold': TALLY_COMPACT_THRESHOLD})
+    compacted = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    return compacted
+
+def discord_list(conn, guild_id: str):
+    election = find_active_election(conn, guild_id, ('registration', 'voting'))
     
     if not election:
-        cursor.close()
         return discord_response('❌ Нет активных выборов', ephemeral=True)
     
-    cursor.execute(
-        "SELECT * FROM candidates WHERE election_id = %s ORDER BY votes DESC, registered_at ASC",
-        (election['id'],)
-    )
-    candidates = cursor.fetchall()
+    pages = get_rendered_list(conn, election)
+    if not pages:
+        return discord_response('📋 Пока нет кандидатов', ephemeral=True)
     
-    if not candidates:
-        cursor.close()
+    return discord_response('', embeds=[pages[0]], components=list_page_components(election['id'], 0, len(pages)))
+
+def handle_discord_component(interaction: Dict[str, Any]) -> Dict[str, Any]:
+    custom_id = interaction.get('data', {}).get('custom_id', '')
+    set_trace_name(f"discord:component:{custom_id.split(':')[0]}")
+    
+    kind, _, rest = custom_id.partition(':')
+    election_id, _, page = rest.rpartition(':')
+    if kind != 'vote_list' or not election_id or not page.isdigit():
+        return discord_response('Неизвестное действие', ephemeral=True)
+    
+    cached = _rendered_lists.get(election_id)
+    if cached and cached[0] > time.monotonic():
+        pages = cached[1]
+    else:
+        with db_connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute("SELECT id, title, status FROM elections WHERE id = %s", (election_id,))
+            election = cursor.fetchone()
+            cursor.close()
+            if not election:
+                return discord_response('❌ Выборы не найдены', ephemeral=True)
+            pages = get_rendered_list(conn, election)
+    
+    if not pages:
         return discord_response('📋 Пока нет кандидатов', ephemeral=True)
     
-    description = '\n\n'.join([
-        f"**{i+1}. {c['user_name']}** {('(' + str(c['votes']) + ' голосов)') if election['status'] == 'voting' else ''}\n*{c['speech']}*"
-        for i, c in enumerate(candidates)
-    ])
+    page_index = min(int(page), len(pages) - 1)
+    return create_json_response({
+        'type': 7,
+        'data': {'embeds': [pages[page_index]], 'components': list_page_components(election_id, page_index, len(pages))}
+    })
+
+def get_rendered_list(conn, election: Dict) -> List[Dict]:
+    cached = _rendered_lists.get(election['id'])
+    now = time.monotonic()
+    if cached and cached[0] > now:
+        return cached[1]
     
-    embed = {
-        'title': f"📋 Кандидаты: {election['title']}",
-        'description': description,
-        'color': 0x5865F2,
-        'footer': {'text': f'Всего кандидатов: {len(candidates)}'}
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute("SELECT user_name, speech, id FROM candidates WHERE election_id = %s ORDER BY registered_at ASC", (election['id'],))
+    candidates = cursor.fetchall()
+    cursor.close()
+    
+    if candidates:
+        tallies = fetch_vote_tallies(conn, [election['id']]).get(election['id'], {})
+        for c in candidates:
+            c['votes'] = tallies.get(c['id'], 0)
+        candidates.sort(key=lambda c: -c['votes'])
+    
+    pages = render_list_pages(election, candidates)
+    if len(_rendered_lists) >= RENDERED_LIST_CACHE_SIZE:
+        _rendered_lists.pop(next(iter(_rendered_lists)), None)
+    _rendered_lists[election['id']] = (now + RENDERED_LIST_CACHE_TTL, pages)
+    return pages
+
+def render_list_pages(election: Dict, candidates: List[Dict]) -> List[Dict]:
+    chunks: List[List[str]] = []
+    length = EMBED_DESCRIPTION_LIMIT
+    for i, c in enumerate(candidates):
+        votes = f" ({c['votes']} голосов)" if election['status'] == 'voting' else ''
+        header = f"**{i+1}. {c['user_name']}**{votes}\n"
+        speech = c['speech']
+        room = EMBED_DESCRIPTION_LIMIT - len(header) - 2
+        if len(speech) > room:
+            speech = speech[:room - 1] + '…'
+        block = f"{header}*{speech}*"
+        
+        if length + 2 + len(block) > EMBED_DESCRIPTION_LIMIT:
+            chunks.append([])
+            length = -2
+        chunks[-1].append(block)
+        length += 2 + len(block)
+    
+    title = f"📋 Кандидаты: {election['title']}"[:EMBED_TITLE_LIMIT]
+    return [
+        {
+            'title': title,
+            'description': '\n\n'.join(blocks),
+            'color': 0x5865F2,
+            'footer': {'text': f'Всего кандидатов: {len(candidates)}' + (f' · Страница {n + 1}/{len(chunks)}' if len(chunks) > 1 else '')}
+        }
+        for n, blocks in enumerate(chunks)
+    ]
+
+def list_page_components(election_id: str, page: int, total: int) -> List[Dict]:
+    if total <= 1:
+        return []
+    
+    return [{
+        'type': 1,
+        'components': [
+            {'type': 2, 'style': 2, 'label': '◀', 'custom_id': f'vote_list:{election_id}:{page - 1}', 'disabled': page == 0},
+            {'type': 2, 'style': 2, 'label': f'{page + 1}/{total}', 'custom_id': f'vote_list:{election_id}:{page}', 'disabled': True},
+            {'type': 2, 'style': 2, 'label': '▶', 'custom_id': f'vote_list:{election_id}:{page + 1}', 'disabled': page >= total - 1}
+        ]
+    }]
+
+def invalidate_rendered_list(election_id: str):
+    _rendered_lists.pop(election_id, None)
+
+def handle_discord_autocomplete(interaction: Dict[str, Any]) -> Dict[str, Any]:
+    set_trace_name('discord:autocomplete')
+    guild_id = interaction.get('guild_id', '')
+    subcommand = (interaction.get('data', {}).get('options') or [{}])[0]
+    focused = next((opt for opt in subcommand.get('options', []) if opt.get('focused')), None)
+    if not guild_id or subcommand.get('name') != 'cast' or not focused:
+        return create_json_response({'type': 8, 'data': {'choices': []}})
+    
+    cached = _active_elections_cache.get(guild_id)
+    if cached and cached[0] > time.monotonic():
+        election = next((e for e in cached[1] if e['status'] == 'voting'), None)
+        index = get_candidate_index(None, election['id']) if election else {}
+    else:
+        index = None
+    
+    if index is None:
+        with db_connection() as conn:
+            election = find_active_election(conn, guild_id, ('voting',))
+            index = get_candidate_index(conn, election['id']) if election else {}
+    
+    choices = [
+        {'name': name[:100], 'value': candidate_user_id}
+        for name, candidate_user_id in search_candidate_index(index, str(focused.get('value', '')))
+    ]
+    return create_json_response({'type': 8, 'data': {'choices': choices}})
+
+def normalize_candidate_name(name: str) -> str:
+    return ' '.join(name.casefold().split())
+
+def get_candidate_index(conn, election_id: str):
+    '''
+    Отсортированный по нормализованному имени список кандидатов выборов для поиска
+    по префиксу через bisect. Без conn отдаёт только закэшированный индекс или None.
+    '''
+    cached = _candidate_indexes.get(election_id)
+    now = time.monotonic()
+    if cached and cached[0] > now:
+        return cached[1]
+    if conn is None:
+        return None
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id, user_name FROM candidates WHERE election_id = %s", (election_id,))
+    rows = cursor.fetchall()
+    cursor.close()
+    
+    entries = sorted((normalize_candidate_name(name), name, candidate_user_id) for candidate_user_id, name in rows)
+    index = {
+        'keys': [entry[0] for entry in entries],
+        'entries': entries,
+        'user_ids': {entry[2] for entry in entries},
+        'by_name': {entry[0]: entry[2] for entry in entries}
     }
+    if len(_candidate_indexes) >= RENDERED_LIST_CACHE_SIZE:
+        _candidate_indexes.pop(next(iter(_candidate_indexes)), None)
+    _candidate_indexes[election_id] = (now + CANDIDATE_INDEX_TTL, index)
+    return index
+
+def search_candidate_index(index: Dict, prefix: str) -> List[tuple]:
+    if not index:
+        return []
+    key = normalize_candidate_name(prefix)
+    start = bisect.bisect_left(index['keys'], key)
+    matches = []
+    for normalized, name, candidate_user_id in index['entries'][start:start + AUTOCOMPLETE_MAX_CHOICES]:
+        if not normalized.startswith(key):
+            break
+        matches.append((name, candidate_user_id))
+    return matches
+
+def resolve_candidate(index: Dict, value: str) -> str:
+    if value in index['user_ids']:
+        return value
+    return index['by_name'].get(normalize_candidate_name(value))
+
+def invalidate_candidate_index(election_id: str):
+    _candidate_indexes.pop(election_id, None)
+
+def get_election_role_sets(election: Dict) -> tuple:
+    '''
+    Множества ID ролей кандидатов и избирателей. Ключ кэша — сами списки ролей из строки
+    выборов, поэтому изменение ролей на любом экземпляре вступает в силу, как только
+    перечитана строка (кэш активных выборов живёт ACTIVE_ELECTION_CACHE_TTL). Названия
+    ролей без запроса к Discord API не сопоставить с member.roles; API их не принимает.
+    '''
+    key = (election['id'], tuple(election.get('candidate_roles') or ()), tuple(election.get('voter_roles') or ()))
+    role_sets = _election_role_sets.get(key)
+    if role_sets is None:
+        role_sets = (parse_role_ids(election.get('candidate_roles')), parse_role_ids(election.get('voter_roles')))
+        if len(_election_role_sets) >= RENDERED_LIST_CACHE_SIZE:
+            _election_role_sets.pop(next(iter(_election_role_sets)), None)
+        _election_role_sets[key] = role_sets
+    return role_sets
+
+def role_id(role: str) -> str:
+    role = role.strip()
+    if role.startswith('<@&') and role.endswith('>'):
+        role = role[3:-1]
+    return role if role.isdigit() else None
+
+def parse_role_ids(roles: List[str]) -> frozenset:
+    return frozenset(filter(None, (role_id(role) for role in roles or [])))
+
+def validate_role_restrictions(data: Dict) -> str:
+    for field in ('candidateRoles', 'voterRoles'):
+        invalid = [role for role in data.get(field) or [] if not isinstance(role, str) or role_id(role) is None]
+        if invalid:
+            return f'{field} must contain role IDs or <@&ID> mentions, got: {", ".join(map(str, invalid))}'
+    return None
+
+def has_required_role(required: frozenset, member_roles: List[str]) -> bool:
+    return not required or not required.isdisjoint(member_roles)
+
+def get_active_elections(conn, guild_id: str) -> List[Dict]:
+    cached = _active_elections_cache.get(guild_id)
+    now = time.monotonic()
+    if cached and cached[0] > now:
+        return cached[1]
     
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(
+        "SELECT * FROM elections WHERE server_id = %s AND status IN ('registration', 'voting') ORDER BY created_at DESC",
+        (guild_id,)
+    )
+    elections = [dict(row) for row in cursor.fetchall()]
     cursor.close()
-    return discord_response('', embeds=[embed])
+    
+    _active_elections_cache[guild_id] = (now + ACTIVE_ELECTION_CACHE_TTL, elections)
+    return elections
+
+def find_active_election(conn, guild_id: str, statuses: tuple):
+    return next((e for e in get_active_elections(conn, guild_id) if e['status'] in statuses), None)
 
-def discord_response(content: str, embeds: List = None, ephemeral: bool = False):
+def invalidate_active_elections(guild_id: str):
+    _active_elections_cache.pop(guild_id, None)
+
+def discord_response(content: str, embeds: List = None, ephemeral: bool = False, components: List = None):
     data = {}
     if content:
         data['content'] = content
     if embeds:
         data['embeds'] = embeds
+    if components:
+        data['components'] = components
     if ephemeral:
         data['flags'] = 64
     
@@ -313,103 +1055,231 @@ def handle_api_request(event: Dict[str, Any]) -> Dict[str, Any]:
     body_str = event.get('body', '{}')
     body = json.loads(body_str) if body_str else {}
     
-    if method == 'POST' and '/register-commands' in path:
-        return api_register_discord_commands(body)
+    route_path = resolve_api_path(path)
+    set_trace_name(f"api:{method} {route_path or 'unknown'}")
     
-    conn = get_db_connection()
+    if route_path is None:
+        return create_json_response({'error': 'Unknown endpoint'}, 404)
     
-    try:
-        if method == 'GET':
-            if '/servers' in path:
-                result = api_get_servers(conn)
-            elif '/elections' in path:
-                result = api_get_elections(conn, query.get('server_id'))
-            else:
-                result = {'error': 'Unknown endpoint'}
-                conn.close()
-                return create_json_response(result, 404)
-        
-        elif method == 'POST':
-            if '/elections/create' in path:
-                result = api_create_election(conn, body)
-            elif '/elections/start-registration' in path:
-                result = api_start_registration(conn, body.get('election_id'))
-            elif '/elections/start-voting' in path:
-                result = api_start_voting(conn, body.get('election_id'))
-            elif '/elections/complete' in path:
-                result = api_complete_election(conn, body.get('election_id'))
-            elif '/candidates/add' in path:
-                result = api_add_candidate(conn, body)
-            elif '/candidates/remove' in path:
-                result = api_remove_candidate(conn, body.get('candidate_id'))
-            elif '/votes/cast' in path:
-                result = api_cast_vote(conn, body)
-            else:
-                result = {'error': 'Unknown endpoint'}
-                conn.close()
-                return create_json_response(result, 404)
-        
-        elif method == 'PUT':
-            if '/elections/update' in path:
-                result = api_update_election(conn, body)
-            else:
-                result = {'error': 'Unknown endpoint'}
-                conn.close()
-                return create_json_response(result, 404)
-        
-        else:
-            conn.close()
-            return create_json_response({'error': 'Method not allowed'}, 405)
+    raw_route = API_RAW_ROUTES.get((method, route_path))
+    if raw_route:
+        return raw_route(query, body)
+    
+    route = API_ROUTES.get((method, route_path))
+    if not route:
+        return create_json_response({'error': 'Method not allowed'}, 405)
+    
+    def respond(conn):
+        version_query = API_ROUTE_VERSIONS.get((method, route_path))
+        if not version_query:
+            return create_json_response(route(conn, query, body))
         
-        conn.close()
-        return create_json_response(result)
+        etag = make_etag(route_path, query, version_query(conn, query))
+        if etag_matches(event.get('headers', {}), etag):
+            return not_modified_response(etag)
+        response = create_json_response(route(conn, query, body))
+        response['headers']['ETag'] = etag
+        response['headers']['Access-Control-Expose-Headers'] = 'ETag'
+        return response
     
+    try:
+        return with_db_connection(respond)
+    except InvalidParameter as e:
+        return create_json_response({'error': str(e)}, 400)
+    except PoolError as e:
+        return create_json_response({'error': str(e)}, 503)
     except Exception as e:
-        conn.close()
         return create_json_response({'error': str(e)}, 500)
 
-def api_get_servers(conn):
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT * FROM servers ORDER BY added_at DESC")
-    servers = cursor.fetchall()
-    
-    result = []
-    for server in servers:
-        cursor.execute("SELECT user_name FROM bot_admins WHERE server_id = %s", (server['id'],))
-        admins = [row['user_name'] for row in cursor.fetchall()]
-        
-        result.append({
-            'id': server['id'],
-            'name': server['name'],
-            'icon': server['icon'],
-            'memberCount': server['member_count'],
-            'botAdmins': admins
-        })
-    
+def resolve_api_path(path: str):
+    if path in _resolved_api_paths:
+        return _resolved_api_paths[path]
+    
+    segments = [segment for segment in path.split('/') if segment]
+    route_path = None
+    for i in range(len(segments)):
+        candidate = '/' + '/'.join(segments[i:])
+        if candidate in API_ROUTE_PATHS:
+            route_path = candidate
+            break
+    
+    if len(_resolved_api_paths) < 1024:
+        _resolved_api_paths[path] = route_path
+    return route_path
+
+API_ROUTES = {
+    ('GET', '/servers'): lambda conn, query, body: api_get_servers(
+        conn, query.get('search'), query.get('limit'), query.get('before')
+    ),
+    ('GET', '/elections'): lambda conn, query, body: api_get_elections(
+        conn, query.get('server_id'), query.get('status'), query.get('limit'), query.get('before')
+    ),
+    ('GET', '/elections/changes'): lambda conn, query, body: api_get_changes(
+        conn, query.get('server_id'), query.get('cursor'), query.get('limit')
+    ),
+    ('GET', '/elections/voters'): lambda conn, query, body: api_get_voters(
+        conn, query.get('election_id'), query.get('limit'), query.get('after')
+    ),
+    ('POST', '/elections/create'): lambda conn, query, body: api_create_election(conn, body),
+    ('POST', '/elections/start-registration'): lambda conn, query, body: api_start_registration(conn, body.get('election_id')),
+    ('POST', '/elections/start-voting'): lambda conn, query, body: api_start_voting(conn, body.get('election_id')),
+    ('POST', '/elections/complete'): lambda conn, query, body: api_complete_election(
+        conn, body.get('election_id'), body.get('election_ids')
+    ),
+    ('POST', '/elections/bulk-create'): lambda conn, query, body: api_bulk_create_elections(conn, body),
+    ('POST', '/candidates/add'): lambda conn, query, body: api_add_candidate(conn, body),
+    ('POST', '/candidates/bulk-add'): lambda conn, query, body: api_bulk_add_candidates(conn, body),
+    ('POST', '/candidates/remove'): lambda conn, query, body: api_remove_candidate(conn, body.get('candidate_id')),
+    ('POST', '/votes/cast'): lambda conn, query, body: api_cast_vote(conn, body),
+    ('POST', '/scheduler/tick'): lambda conn, query, body: api_scheduler_tick(conn, body),
+    ('PUT', '/elections/update'): lambda conn, query, body: api_update_election(conn, body),
+}
+
+API_RAW_ROUTES = {
+    ('POST', '/register-commands'): lambda query, body: api_register_discord_commands(body),
+    ('GET', '/metrics'): lambda query, body: create_json_response(api_get_metrics()),
+    ('GET', '/elections/voters/export'): lambda query, body: api_export_voters(query),
+}
+
+API_ROUTE_VERSIONS = {
+    ('GET', '/servers'): lambda conn, query: servers_version(conn),
+    ('GET', '/elections'): lambda conn, query: elections_version(conn, query.get('server_id')),
+}
+
+API_ROUTE_PATHS = frozenset(route_path for _, route_path in list(API_ROUTES) + list(API_RAW_ROUTES))
+
+def servers_version(conn) -> tuple:
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT s.count, s.updated, s.added, a.count, a.added
+        FROM (SELECT COUNT(*) AS count, MAX(updated_at) AS updated, MAX(added_at) AS added FROM servers) s,
+             (SELECT COUNT(*) AS count, MAX(added_at) AS added FROM bot_admins) a
+        """
+    )
+    version = cursor.fetchone()
     cursor.close()
-    return {'servers': result}
+    return version
 
-def api_get_elections(conn, server_id: str = None):
+def elections_version(conn, server_id: str = None) -> tuple:
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        WITH scoped AS (
+            SELECT id, updated_at FROM elections
+            WHERE %(server_id)s::text IS NULL OR server_id = %(server_id)s
+        )
+        SELECT
+            (SELECT COUNT(*) FROM scoped),
+            (SELECT MAX(updated_at) FROM scoped),
+            (SELECT COUNT(*) FROM candidates WHERE election_id IN (SELECT id FROM scoped)),
+            (SELECT MAX(registered_at) FROM candidates WHERE election_id IN (SELECT id FROM scoped)),
+            (SELECT MAX(v.id) FROM scoped e CROSS JOIN LATERAL (
+                SELECT MAX(id) AS id FROM votes WHERE election_id = e.id
+            ) v)
+        """,
+        {'server_id': server_id}
+    )
+    version = cursor.fetchone()
+    cursor.close()
+    return version
+
+def make_etag(route_path: str, query: Dict, version: tuple) -> str:
+    key = json.dumps([route_path, sorted(query.items()), [str(part) for part in version]])
+    return 'W/"' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '"'
+
+def etag_matches(headers: Dict, etag: str) -> bool:
+    if_none_match = next((v for k, v in headers.items() if k.lower() == 'if-none-match'), '')
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or etag[2:] in candidates
+
+def not_modified_response(etag: str):
+    return {
+        'statusCode': 304,
+        'headers': {'ETag': etag, 'Access-Control-Allow-Origin': '*', 'Access-Control-Expose-Headers': 'ETag'},
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+def api_get_servers(conn, search: str = None, limit: str = None, before: str = None):
+    page_size = parse_page_limit(limit)
+    before_at, before_id = decode_page_cursor(before)
+    pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%' if search else None
     cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(
+        """
+        WITH page AS (
+            SELECT * FROM servers
+            WHERE (%(pattern)s::text IS NULL OR name ILIKE %(pattern)s)
+              AND (%(before_at)s::timestamp IS NULL OR (added_at, id) < (%(before_at)s::timestamp, %(before_id)s))
+            ORDER BY added_at DESC, id DESC
+            LIMIT %(limit)s
+        )
+        SELECT page.*,
+            COALESCE(array_agg(a.user_name ORDER BY a.added_at) FILTER (WHERE a.user_name IS NOT NULL), '{}') AS bot_admins
+        FROM page LEFT JOIN bot_admins a ON a.server_id = page.id
+        GROUP BY page.id, page.name, page.icon, page.member_count, page.added_at, page.updated_at
+        ORDER BY page.added_at DESC, page.id DESC
+        """,
+        {'pattern': pattern, 'before_at': before_at, 'before_id': before_id, 'limit': page_size}
+    )
+    servers = cursor.fetchall()
+    cursor.close()
     
-    if server_id:
-        cursor.execute("SELECT * FROM elections WHERE server_id = %s ORDER BY created_at DESC", (server_id,))
-    else:
-        cursor.execute("SELECT * FROM elections ORDER BY created_at DESC")
+    result = [
+        {
+            'id': server['id'],
+            'name': server['name'],
+            'icon': server['icon'],
+            'memberCount': server['member_count'],
+            'botAdmins': server['bot_admins']
+        }
+        for server in servers
+    ]
     
+    next_cursor = encode_page_cursor(servers[-1]['added_at'], servers[-1]['id']) if len(servers) == page_size else None
+    return {'servers': result, 'nextCursor': next_cursor}
+
+def api_get_elections(conn, server_id: str = None, status: str = None, limit: str = None, before: str = None):
+    if status and status not in ELECTION_STATUSES:
+        return {'error': f'Unknown status: {status}'}
+    
+    page_size = parse_page_limit(limit)
+    before_at, before_id = decode_page_cursor(before)
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    
+    cursor.execute(
+        """
+        SELECT * FROM elections
+        WHERE (%(server_id)s::text IS NULL OR server_id = %(server_id)s)
+          AND (%(status)s::text IS NULL OR status = %(status)s)
+          AND (%(before_at)s::timestamp IS NULL OR (created_at, id) < (%(before_at)s::timestamp, %(before_id)s))
+        ORDER BY created_at DESC, id DESC
+        LIMIT %(limit)s
+        """,
+        {'server_id': server_id, 'status': status, 'before_at': before_at, 'before_id': before_id, 'limit': page_size}
+    )
     elections = cursor.fetchall()
-    result = []
+    election_ids = [e['id'] for e in elections]
+    
+    candidates_by_election: Dict[str, List] = {election_id: [] for election_id in election_ids}
+    tallies = fetch_vote_tallies(conn, election_ids) if election_ids else {}
     
+    if election_ids:
+        cursor.execute("SELECT * FROM candidates WHERE election_id = ANY(%s) ORDER BY registered_at ASC", (election_ids,))
+        for c in cursor.fetchall():
+            c['votes'] = tallies.get(c['election_id'], {}).get(c['id'], 0)
+            candidates_by_election[c['election_id']].append(c)
+        for candidates in candidates_by_election.values():
+            candidates.sort(key=lambda c: -c['votes'])
+    
+    cursor.close()
+    
+    result = []
     for election in elections:
-        cursor.execute(
-            "SELECT * FROM candidates WHERE election_id = %s ORDER BY votes DESC",
-            (election['id'],)
-        )
-        candidates = cursor.fetchall()
-        
-        cursor.execute("SELECT user_name, candidate_id FROM votes WHERE election_id = %s", (election['id'],))
-        user_votes = {row['user_name']: row['candidate_id'] for row in cursor.fetchall()}
-        
+        candidates = candidates_by_election[election['id']]
         result.append({
             'id': election['id'],
             'serverId': election['server_id'],
@@ -429,9 +1299,11 @@ def api_get_elections(conn, server_id: str = None):
             'autoStart': election['auto_start'],
             'retryOnFail': election['retry_on_fail'],
             'maxVotingAttempts': election['max_voting_attempts'],
+            'votingMethod': election['voting_method'],
+            'seats': election['seats'],
             'registrationAttempts': election['registration_attempts'],
             'votingAttempts': election['voting_attempts'],
-            'totalVotes': election['total_votes'],
+            'totalVotes': sum(tallies.get(election['id'], {}).values()),
             'registrationStartDate': election['registration_start_date'].isoformat() if election['registration_start_date'] else None,
             'registrationEndDate': election['registration_end_date'].isoformat() if election['registration_end_date'] else None,
             'votingStartDate': election['voting_start_date'].isoformat() if election['voting_start_date'] else None,
@@ -439,7 +1311,7 @@ def api_get_elections(conn, server_id: str = None):
             'termEndDate': election['term_end_date'].isoformat() if election['term_end_date'] else None,
             'currentWinner': election['current_winner'],
             'winnerUserId': election['winner_user_id'],
-            'userVotes': user_votes,
+            'winnerUserIds': election['winner_user_ids'],
             'candidates': [
                 {
                     'id': c['id'],
@@ -453,11 +1325,259 @@ def api_get_elections(conn, server_id: str = None):
             ]
         })
     
+    next_cursor = encode_page_cursor(elections[-1]['created_at'], elections[-1]['id']) if len(elections) == page_size else None
+    return {'elections': result, 'nextCursor': next_cursor}
+
+def api_get_voters(conn, election_id: str = None, limit: str = None, after: str = None):
+    if not election_id:
+        return {'error': 'election_id is required'}
+    
+    page_size = parse_page_limit(limit)
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(
+        """
+        SELECT id, user_id, user_name, candidate_id, voted_at FROM votes
+        WHERE election_id = %(election_id)s AND id > %(after)s
+        ORDER BY id
+        LIMIT %(limit)s
+        """,
+        {'election_id': election_id, 'after': parse_int_param('after', after, 0, 0, INT4_MAX), 'limit': page_size}
+    )
+    votes = cursor.fetchall()
+    cursor.close()
+    
+    result = [
+        {
+            'userId': v['user_id'],
+            'userName': v['user_name'],
+            'candidateId': v['candidate_id'],
+            'votedAt': v['voted_at'].isoformat()
+        }
+        for v in votes
+    ]
+    
+    next_cursor = str(votes[-1]['id']) if len(votes) == page_size else None
+    return {'voters': result, 'nextCursor': next_cursor}
+
+VOTER_EXPORT_FORMATS = {
+    'csv': (
+        'text/csv; charset=utf-8',
+        "SELECT user_id, user_name, candidate_id, voted_at FROM votes WHERE election_id = %s ORDER BY id",
+        "CSV HEADER"
+    ),
+    # Строки JSON без сырых переводов строк и управляющих символов, поэтому CSV с
+    # кавычкой и разделителем \x01/\x02 отдаёт их как есть, без экранирования COPY
+    'ndjson': (
+        'application/x-ndjson',
+        """
+        SELECT json_build_object(
+            'userId', user_id, 'userName', user_name, 'candidateId', candidate_id, 'votedAt', voted_at
+        )::text FROM votes WHERE election_id = %s ORDER BY id
+        """,
+        "CSV QUOTE e'\\x01' DELIMITER e'\\x02'"
+    ),
+}
+
+def export_voters(conn, election_id: str, fmt: str, sink):
+    '''
+    Построчная выгрузка голосов через COPY ... TO STDOUT: строки пишутся в sink по мере
+    получения и не собираются в Python-объекты, память не зависит от числа избирателей.
+    '''
+    _, select_sql, copy_options = VOTER_EXPORT_FORMATS[fmt]
+    cursor = conn.cursor()
+    statement = cursor.mogrify(select_sql, (election_id,)).decode('utf-8')
+    cursor.copy_expert(f"COPY ({statement}) TO STDOUT WITH {copy_options}", sink)
     cursor.close()
-    return {'elections': result}
+
+def api_export_voters(query: Dict):
+    election_id = query.get('election_id')
+    fmt = query.get('format', 'ndjson')
+    if not election_id:
+        return create_json_response({'error': 'election_id is required'}, 400)
+    if fmt not in VOTER_EXPORT_FORMATS:
+        return create_json_response({'error': f'Unknown format: {fmt}'}, 400)
+    
+    # Serverless-ответ отдаётся одним телом; долгоживущий сервер передаёт sink-сокет напрямую
+    sink = io.StringIO()
+    try:
+        with db_connection() as conn:
+            export_voters(conn, election_id, fmt, sink)
+    except Exception as e:
+        return create_json_response({'error': str(e)}, 500)
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': VOTER_EXPORT_FORMATS[fmt][0],
+            'Content-Disposition': f'attachment; filename="{election_id}-voters.{fmt}"',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': sink.getvalue(),
+        'isBase64Encoded': False
+    }
+
+def record_change(cursor, election_id: str, kind: str, payload: Dict):
+    cursor.execute(
+        """
+        INSERT INTO election_changes (server_id, election_id, kind, payload)
+        SELECT server_id, id, %s, %s FROM elections WHERE id = %s
+        """,
+        (kind, Json(payload), election_id)
+    )
+
+def record_changes(cursor, election_ids: List[str], kind: str, payload: Dict):
+    if not election_ids:
+        return
+    cursor.execute(
+        """
+        INSERT INTO election_changes (server_id, election_id, kind, payload)
+        SELECT server_id, id, %s, %s FROM elections WHERE id = ANY(%s)
+        """,
+        (kind, Json(payload), list(election_ids))
+    )
+
+def record_change_rows(cursor, kind: str, rows: List[tuple]):
+    if not rows:
+        return
+    execute_values(
+        cursor,
+        """
+        INSERT INTO election_changes (server_id, election_id, kind, payload)
+        SELECT e.server_id, e.id, p.kind, p.payload FROM (VALUES %s) AS p (id, kind, payload) JOIN elections e USING (id)
+        """,
+        [(election_id, kind, Json(payload)) for election_id, payload in rows],
+        template='(%s, %s, %s::jsonb)', page_size=BULK_PAGE_SIZE
+    )
+
+def parse_changes_cursor(value: str = None) -> tuple:
+    txid, _, seq = (value or '').partition('.')
+    if not txid.isdigit() or seq and not seq.isdigit() or int(txid) > INT8_MAX or int(seq or 0) > INT8_MAX:
+        raise InvalidParameter('cursor must be a cursor returned by /elections/changes')
+    return int(txid), int(seq or 0)
+
+def api_get_changes(conn, server_id: str = None, since: str = None, limit: str = None):
+    '''
+    Курсор — пара (txid, seq). Отдаются только изменения транзакций с txid ниже xmin
+    текущего снимка: все они уже завершены, поэтому ни одна запись не будет пропущена.
+    '''
+    if not server_id:
+        return {'error': 'server_id is required'}
+    
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    
+    if not since:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) AS horizon")
+        horizon = cursor.fetchone()['horizon']
+        cursor.close()
+        return {'changes': [], 'cursor': f"{horizon}.0", 'hasMore': False}
+    
+    after_txid, after_seq = parse_changes_cursor(since)
+    page_size = parse_page_limit(limit) if limit else MAX_PAGE_LIMIT
+    cursor.execute(
+        """
+        WITH horizon AS (SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin)
+        SELECT h.xmin AS horizon, c.* FROM horizon h
+        LEFT JOIN LATERAL (
+            SELECT seq, txid, election_id, kind, payload, created_at FROM election_changes
+            WHERE server_id = %(server_id)s
+              AND (txid, seq) > (%(txid)s, %(seq)s)
+              AND txid < h.xmin
+            ORDER BY txid, seq
+            LIMIT %(limit)s
+        ) c ON TRUE
+        """,
+        {'server_id': server_id, 'txid': after_txid, 'seq': after_seq, 'limit': page_size}
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    
+    changes = [row for row in rows if row['seq'] is not None]
+    has_more = len(changes) == page_size
+    if has_more:
+        next_cursor = f"{changes[-1]['txid']}.{changes[-1]['seq']}"
+    else:
+        next_cursor = f"{max(rows[0]['horizon'], after_txid)}.0"
+    
+    return {
+        'changes': [
+            {
+                'seq': c['seq'],
+                'electionId': c['election_id'],
+                'kind': c['kind'],
+                'payload': c['payload'],
+                'createdAt': c['created_at'].isoformat()
+            }
+            for c in changes
+        ],
+        'cursor': next_cursor,
+        'hasMore': has_more
+    }
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}_{int(time.time() * 1000)}_{secrets.token_hex(4)}"
+
+def election_row(election_id: str, data: Dict) -> tuple:
+    return (
+        election_id, data['serverId'], data['title'], data.get('description', ''),
+        data['assignedRoles'], data.get('candidateRoles', []), data.get('voterRoles', []),
+        data['duration'], data['registrationDuration'], data['termDuration'], data.get('daysBeforeTermEnd', 2),
+        data.get('minVotesThresholdPercent', 20), data['serverMemberCount'],
+        data.get('keepOldRoles', False), data.get('autoStart', True),
+        data.get('retryOnFail', True), data.get('maxVotingAttempts', 2),
+        data.get('votingMethod', 'fptp'), data.get('seats', 1)
+    )
+
+INT4_MIN, INT4_MAX = -2 ** 31, 2 ** 31 - 1
+INT8_MAX = 2 ** 63 - 1
+
+def validate_bulk_item(data: Any, required: Dict[str, type], optional: Dict[str, type] = None) -> str:
+    if not isinstance(data, dict):
+        return 'Item must be an object'
+    for field, kind in list(required.items()) + list((optional or {}).items()):
+        value = data.get(field)
+        if value is None or value == '':
+            if field in required:
+                return f'{field} is required'
+            continue
+        if not isinstance(value, kind) or isinstance(value, bool) and kind is not bool:
+            return f'{field} has invalid type'
+        # Всё, что не пройдёт приведение типов в базе, отсекается здесь: ошибка одного
+        # элемента в общей транзакции отменила бы всю пачку
+        if kind is list and not all(isinstance(v, str) for v in value):
+            return f'{field} must contain strings'
+        if kind is int and not INT4_MIN <= value <= INT4_MAX:
+            return f'{field} is out of range'
+    return None
+
+ELECTION_REQUIRED_FIELDS = {
+    'serverId': str, 'title': str, 'assignedRoles': list, 'duration': int,
+    'registrationDuration': int, 'termDuration': int, 'serverMemberCount': int
+}
+
+ELECTION_OPTIONAL_FIELDS = {
+    'description': str, 'candidateRoles': list, 'voterRoles': list, 'daysBeforeTermEnd': int,
+    'minVotesThresholdPercent': int, 'keepOldRoles': bool, 'autoStart': bool, 'retryOnFail': bool,
+    'maxVotingAttempts': int, 'votingMethod': str, 'seats': int
+}
+
+def validate_voting_method(data: Dict) -> str:
+    method = data.get('votingMethod', 'fptp')
+    if method not in tally.METHODS:
+        return f'Unknown voting method: {method}'
+    seats = data.get('seats', 1)
+    if not isinstance(seats, int) or isinstance(seats, bool) or seats < 1:
+        return 'seats must be a positive integer'
+    if method == 'irv' and seats != 1:
+        return 'irv elects a single winner'
+    return None
+
+CANDIDATE_REQUIRED_FIELDS = {'electionId': str, 'userId': str, 'userName': str, 'speech': str}
 
 def api_create_election(conn, data: Dict):
-    election_id = f"election_{int(datetime.now().timestamp() * 1000)}"
+    error = validate_voting_method(data) or validate_role_restrictions(data)
+    if error:
+        return {'error': error}
+    election_id = new_id('election')
     cursor = conn.cursor()
     
     cursor.execute(
@@ -467,24 +1587,87 @@ def api_create_election(conn, data: Dict):
             assigned_roles, candidate_roles, voter_roles,
             duration, registration_duration, term_duration, days_before_term_end,
             min_votes_threshold_percent, server_member_count,
-            keep_old_roles, auto_start, retry_on_fail, max_voting_attempts
-        ) VALUES (%s, %s, %s, %s, 'scheduled', %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            keep_old_roles, auto_start, retry_on_fail, max_voting_attempts,
+            voting_method, seats
+        ) VALUES (%s, %s, %s, %s, 'scheduled', %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """,
-        (
-            election_id, data['serverId'], data['title'], data.get('description', ''),
-            data['assignedRoles'], data.get('candidateRoles', []), data.get('voterRoles', []),
-            data['duration'], data['registrationDuration'], data['termDuration'], data.get('daysBeforeTermEnd', 2),
-            data.get('minVotesThresholdPercent', 20), data['serverMemberCount'],
-            data.get('keepOldRoles', False), data.get('autoStart', True),
-            data.get('retryOnFail', True), data.get('maxVotingAttempts', 2)
-        )
+        election_row(election_id, data)
     )
+    record_change(cursor, election_id, 'election_created', {'status': 'scheduled'})
     conn.commit()
     cursor.close()
     
     return {'success': True, 'electionId': election_id}
 
+BULK_ELECTION_TEMPLATE = (
+    "(%s, %s, %s, %s, %s::text[], %s::text[], %s::text[], %s::int, %s::int, %s::int, %s::int,"
+    " %s::int, %s::int, %s::boolean, %s::boolean, %s::boolean, %s::int, %s, %s::int)"
+)
+
+def api_bulk_create_elections(conn, data: Dict):
+    items = data.get('elections')
+    if not isinstance(items, list) or len(items) > BULK_MAX_ITEMS:
+        return {'error': f'elections must be an array of at most {BULK_MAX_ITEMS} items'}
+    
+    errors, rows, indexes = [], [], []
+    for index, item in enumerate(items):
+        error = validate_bulk_item(item, ELECTION_REQUIRED_FIELDS, ELECTION_OPTIONAL_FIELDS)
+        error = error or validate_voting_method(item) or validate_role_restrictions(item)
+        if error:
+            errors.append({'index': index, 'error': error})
+            continue
+        rows.append(election_row(new_id('election'), item))
+        indexes.append(index)
+    
+    cursor = conn.cursor()
+    inserted = execute_values(
+        cursor,
+        """
+        INSERT INTO elections (
+            id, server_id, title, description, status,
+            assigned_roles, candidate_roles, voter_roles,
+            duration, registration_duration, term_duration, days_before_term_end,
+            min_votes_threshold_percent, server_member_count,
+            keep_old_roles, auto_start, retry_on_fail, max_voting_attempts,
+            voting_method, seats
+        )
+        SELECT v.id, v.server_id, v.title, v.description, 'scheduled',
+            v.assigned_roles, v.candidate_roles, v.voter_roles,
+            v.duration, v.registration_duration, v.term_duration, v.days_before_term_end,
+            v.min_votes_threshold_percent, v.server_member_count,
+            v.keep_old_roles, v.auto_start, v.retry_on_fail, v.max_voting_attempts,
+            v.voting_method, v.seats
+        FROM (VALUES %s) AS v (
+            id, server_id, title, description,
+            assigned_roles, candidate_roles, voter_roles,
+            duration, registration_duration, term_duration, days_before_term_end,
+            min_votes_threshold_percent, server_member_count,
+            keep_old_roles, auto_start, retry_on_fail, max_voting_attempts,
+            voting_method, seats
+        )
+        JOIN servers s ON s.id = v.server_id
+        RETURNING id
+        """,
+        rows, template=BULK_ELECTION_TEMPLATE, page_size=BULK_PAGE_SIZE, fetch=True
+    ) if rows else []
+    created_ids = {row[0] for row in inserted}
+    record_changes(cursor, list(created_ids), 'election_created', {'status': 'scheduled'})
+    conn.commit()
+    cursor.close()
+    
+    created = []
+    for index, row in zip(indexes, rows):
+        if row[0] in created_ids:
+            created.append({'index': index, 'electionId': row[0]})
+        else:
+            errors.append({'index': index, 'error': 'Server not found'})
+    
+    return {'success': True, 'created': created, 'errors': sorted(errors, key=lambda e: e['index'])}
+
 def api_update_election(conn, data: Dict):
+    error = validate_voting_method(data) or validate_role_restrictions(data)
+    if error:
+        return {'error': error}
     cursor = conn.cursor()
     
     cursor.execute(
@@ -495,8 +1678,10 @@ def api_update_election(conn, data: Dict):
             duration = %s, registration_duration = %s, term_duration = %s, days_before_term_end = %s,
             min_votes_threshold_percent = %s, server_member_count = %s,
             keep_old_roles = %s, auto_start = %s, retry_on_fail = %s, max_voting_attempts = %s,
+            voting_method = %s, seats = %s,
             updated_at = CURRENT_TIMESTAMP
         WHERE id = %s
+        RETURNING server_id
         """,
         (
             data['title'], data.get('description', ''),
@@ -505,154 +1690,562 @@ def api_update_election(conn, data: Dict):
             data.get('minVotesThresholdPercent', 20), data['serverMemberCount'],
             data.get('keepOldRoles', False), data.get('autoStart', True),
             data.get('retryOnFail', True), data.get('maxVotingAttempts', 2),
+            data.get('votingMethod', 'fptp'), data.get('seats', 1),
             data['id']
         )
     )
+    updated = cursor.fetchone()
+    if updated:
+        record_change(cursor, data['id'], 'election_updated', {})
     conn.commit()
     cursor.close()
     
+    if updated:
+        invalidate_active_elections(updated[0])
+        invalidate_rendered_list(data['id'])
+    
     return {'success': True}
 
 def api_start_registration(conn, election_id: str):
     cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT registration_duration FROM elections WHERE id = %s", (election_id,))
-    election = cursor.fetchone()
-    
-    if not election:
-        cursor.close()
-        return {'error': 'Election not found'}
-    
-    now = datetime.now()
-    end = now + timedelta(hours=election['registration_duration'])
-    
-    cursor.execute(
-        """
-        UPDATE elections SET status = 'registration', registration_start_date = %s,
-        registration_end_date = %s, registration_attempts = registration_attempts + 1,
-        updated_at = CURRENT_TIMESTAMP WHERE id = %s
-        """,
-        (now, end, election_id)
-    )
+    started = start_registrations(cursor, [election_id], datetime.now())
     conn.commit()
     cursor.close()
     
+    if not started:
+        return {'error': 'Election not found'}
+    
+    invalidate_active_elections(started[0]['server_id'])
+    invalidate_rendered_list(election_id)
+    invalidate_candidate_index(election_id)
     return {'success': True}
 
 def api_start_voting(conn, election_id: str):
     cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT duration FROM elections WHERE id = %s", (election_id,))
-    election = cursor.fetchone()
+    started = start_votings(cursor, [election_id], datetime.now())
+    conn.commit()
+    cursor.close()
     
-    if not election:
-        cursor.close()
+    if not started:
         return {'error': 'Election not found'}
     
-    now = datetime.now()
-    end = now + timedelta(hours=election['duration'])
-    
+    invalidate_active_elections(started[0]['server_id'])
+    invalidate_rendered_list(election_id)
+    return {'success': True}
+
+def start_registrations(cursor, election_ids: List[str], now: datetime, from_status: str = None,
+                        payload: Dict = None) -> List[Dict]:
+    cursor.execute(
+        """
+        UPDATE elections SET status = 'registration', registration_start_date = %(now)s,
+        registration_end_date = %(now)s + make_interval(hours => registration_duration),
+        registration_attempts = registration_attempts + 1, transition_lease_until = NULL,
+        updated_at = CURRENT_TIMESTAMP
+        WHERE id = ANY(%(ids)s) AND (%(from_status)s::text IS NULL OR status = %(from_status)s)
+        RETURNING id, server_id
+        """,
+        {'now': now, 'ids': list(election_ids), 'from_status': from_status}
+    )
+    started = cursor.fetchall()
+    record_changes(cursor, [e['id'] for e in started], 'status', dict(payload or {}, status='registration'))
+    return started
+
+def start_votings(cursor, election_ids: List[str], now: datetime, from_status: str = None) -> List[Dict]:
+    cursor.execute(
+        """
+        UPDATE elections SET status = 'voting', voting_start_date = %(now)s,
+        voting_end_date = %(now)s + make_interval(hours => duration),
+        voting_attempts = voting_attempts + 1, transition_lease_until = NULL,
+        updated_at = CURRENT_TIMESTAMP
+        WHERE id = ANY(%(ids)s) AND (%(from_status)s::text IS NULL OR status = %(from_status)s)
+        RETURNING id, server_id
+        """,
+        {'now': now, 'ids': list(election_ids), 'from_status': from_status}
+    )
+    started = cursor.fetchall()
+    ids = [e['id'] for e in started]
+    reset_ballots(cursor, ids)
+    if ids:
+        # Номера в бюллетене фиксируются на время голосования: ранжированные голоса хранят их, а не id
+        cursor.execute(
+            """
+            UPDATE candidates c SET ballot_index = n.ballot_index
+            FROM (
+                SELECT id, row_number() OVER (PARTITION BY election_id ORDER BY registered_at, id) - 1 AS ballot_index
+                FROM candidates WHERE election_id = ANY(%s)
+            ) n
+            WHERE c.id = n.id
+            """,
+            (ids,)
+        )
+    record_changes(cursor, ids, 'status', {'status': 'voting', 'votesReset': True})
+    return started
+
+def reset_ballots(cursor, election_ids: List[str], candidates: bool = False):
+    if not election_ids:
+        return
+    cursor.execute("DELETE FROM vote_tallies WHERE election_id = ANY(%s)", (list(election_ids),))
+    cursor.execute("DELETE FROM votes WHERE election_id = ANY(%s)", (list(election_ids),))
+    if candidates:
+        cursor.execute("DELETE FROM candidates WHERE election_id = ANY(%s)", (list(election_ids),))
+
+def renew_terms(cursor, election_ids: List[str], now: datetime) -> List[Dict]:
     cursor.execute(
         """
-        UPDATE elections SET status = 'voting', voting_start_date = %s,
-        voting_end_date = %s, voting_attempts = voting_attempts + 1,
-        updated_at = CURRENT_TIMESTAMP WHERE id = %s
+        UPDATE elections SET voting_attempts = 0
+        WHERE id = ANY(%s) AND status = 'completed' AND auto_start
+        RETURNING id
         """,
-        (now, end, election_id)
+        (list(election_ids),)
     )
-    cursor.execute("DELETE FROM votes WHERE election_id = %s", (election_id,))
-    cursor.execute("UPDATE candidates SET votes = 0 WHERE election_id = %s", (election_id,))
-    cursor.execute("UPDATE elections SET total_votes = 0 WHERE id = %s", (election_id,))
+    ids = [row['id'] for row in cursor.fetchall()]
+    reset_ballots(cursor, ids, candidates=True)
+    return start_registrations(cursor, ids, now, payload={'termRenewal': True})
+
+def api_complete_election(conn, election_id: str = None, election_ids: List[str] = None):
+    errors = []
+    if election_ids is not None:
+        if not isinstance(election_ids, list) or len(election_ids) > BULK_MAX_ITEMS:
+            return {'error': f'election_ids must be an array of at most {BULK_MAX_ITEMS} items'}
+        errors = [
+            {'index': index, 'error': 'Election id must be a non-empty string'}
+            for index, item in enumerate(election_ids) if not isinstance(item, str) or not item
+        ]
+        election_ids = [item for item in election_ids if isinstance(item, str) and item]
+    
+    ids = list(election_ids) if election_ids or errors else [election_id]
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    completed = complete_elections(cursor, ids, datetime.now()) if ids else []
     conn.commit()
     cursor.close()
     
-    return {'success': True}
+    results = {election['id']: election['result'] for election in completed}
+    for election in completed:
+        invalidate_active_elections(election['server_id'])
+        invalidate_rendered_list(election['id'])
+        invalidate_candidate_index(election['id'])
+    
+    if election_ids or errors:
+        return {
+            'success': True, 'results': {i: results.get(i, {'error': 'Election not found'}) for i in ids},
+            'errors': errors
+        }
+    return results.get(election_id, {'error': 'Election not found'})
 
-def api_complete_election(conn, election_id: str):
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT * FROM elections WHERE id = %s", (election_id,))
-    election = cursor.fetchone()
+COMPLETION_TALLIES_SQL = f"""
+    SELECT c.election_id, c.id AS candidate_id, c.user_id, c.user_name, c.ballot_index, c.registered_at,
+           COALESCE(t.votes, 0) AS votes
+    FROM candidates c
+    LEFT JOIN ({VOTE_TALLIES_SQL}) t ON t.candidate_id = c.id
+    WHERE c.election_id = ANY(%(ids)s)
+    ORDER BY c.election_id, votes DESC, c.registered_at, c.id
+"""
+
+# Одинаковые бюллетени группируются в базе по текстовому виду (хеш по строке дешевле
+# сортировки массивов) и отдаются одной строкой на выборы: номера дополнены -1 до общей
+# ширины и склеены через запятую, чтобы tally разобрал их целым массивом
+RANKED_BALLOTS_SQL = """
+    WITH grouped AS (
+        SELECT v.election_id, array_to_string(COALESCE(v.ranking, ARRAY[c.ballot_index]), ',') AS ranking,
+               COALESCE(cardinality(v.ranking), 1) AS length, COUNT(*) AS weight
+        FROM votes v JOIN candidates c ON c.id = v.candidate_id
+        WHERE v.election_id = ANY(%s)
+        GROUP BY 1, 2, 3
+    ),
+    padded AS (
+        SELECT election_id, ranking, length, weight, MAX(length) OVER (PARTITION BY election_id) AS width
+        FROM grouped
+    )
+    SELECT election_id, width,
+           string_agg(ranking || repeat(',-1', width - length), ',' ORDER BY ranking) AS ballots,
+           string_agg(weight::text, ',' ORDER BY ranking) AS weights
+    FROM padded GROUP BY election_id, width
+"""
+
+def elect_ranked(cursor, elections: List[Dict], standings: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+    '''
+    Победители irv/stv: одинаковые бюллетени читаются из базы сгруппированными с весом
+    и пересчитываются движком tally. Голос без ranking — бюллетень из одного кандидата.
+    '''
+    if not elections:
+        return {}
+    cursor.execute(RANKED_BALLOTS_SQL, ([e['id'] for e in elections],))
+    ballots = {row['election_id']: row for row in cursor.fetchall()}
     
-    if not election:
-        cursor.close()
-        return {'error': 'Election not found'}
+    elected = {}
+    for election in elections:
+        candidates = sorted(standings.get(election['id'], []), key=lambda c: (c['registered_at'], c['candidate_id']))
+        row = ballots.get(election['id']) or {'ballots': '', 'weights': '', 'width': 0}
+        rows, weights = tally.parse_ballots(
+            row['ballots'], row['weights'], row['width'], {c['ballot_index']: i for i, c in enumerate(candidates)}
+        )
+        winners = tally.elect(election['voting_method'], rows, len(candidates), election['seats'], weights)
+        elected[election['id']] = [candidates[i] for i in winners]
+    return elected
+
+def complete_elections(cursor, election_ids: List[str], now: datetime) -> List[Dict]:
+    '''
+    Подведение итогов как один переход состояния в транзакции вызывающего: строки выборов
+    блокируются один раз, итоги читаются одним запросом, а ветки победы, повторного
+    голосования, новой регистрации и провала применяются пачками. Ничья решается в пользу
+    кандидата, зарегистрировавшегося раньше. fptp берёт seats лидеров по числу голосов,
+    irv/stv пересчитываются по ранжированным бюллетеням.
+    '''
+    cursor.execute(
+        """
+        SELECT id, server_id, status, server_member_count, min_votes_threshold_percent, term_duration,
+               auto_start, retry_on_fail, voting_attempts, max_voting_attempts, voting_method, seats
+        FROM elections WHERE id = ANY(%s)
+        ORDER BY id
+        FOR UPDATE
+        """,
+        (list(election_ids),)
+    )
+    elections = cursor.fetchall()
     
-    required_votes = int(election['server_member_count'] * election['min_votes_threshold_percent'] / 100)
-    cursor.execute("SELECT * FROM candidates WHERE election_id = %s ORDER BY votes DESC LIMIT 1", (election_id,))
-    winner = cursor.fetchone()
+    voting = [e for e in elections if e['status'] == 'voting']
+    for election in elections:
+        if election['status'] != 'voting':
+            election['result'] = {'error': 'Election is not in voting phase'}
+    if not voting:
+        return elections
+    
+    cursor.execute(COMPLETION_TALLIES_SQL, {'ids': [e['id'] for e in voting]})
+    standings: Dict[str, List[Dict]] = {}
+    totals: Dict[str, int] = {}
+    for row in cursor.fetchall():
+        standings.setdefault(row['election_id'], []).append(row)
+        totals[row['election_id']] = totals.get(row['election_id'], 0) + row['votes']
+    
+    elected = {e['id']: standings.get(e['id'], [])[:e['seats']] for e in voting if e['voting_method'] == 'fptp'}
+    elected.update(elect_ranked(cursor, [e for e in voting if e['voting_method'] != 'fptp'], standings))
+    
+    winners, retries, reregistrations, failures = [], [], [], []
+    for election in voting:
+        required_votes = int(election['server_member_count'] * election['min_votes_threshold_percent'] / 100)
+        seated = elected[election['id']]
+        if seated and totals[election['id']] >= required_votes:
+            winner = seated[0]
+            winners.append((
+                election['id'], winner['user_name'], winner['user_id'], [c['user_id'] for c in seated],
+                now + timedelta(hours=election['term_duration'])
+            ))
+            election['result'] = {
+                'success': True, 'status': 'completed', 'winner': winner['user_name'],
+                'winners': [c['user_name'] for c in seated]
+            }
+        elif election['retry_on_fail'] and election['voting_attempts'] < election['max_voting_attempts']:
+            retries.append(election['id'])
+            election['result'] = {'success': True, 'status': 'voting'}
+        elif election['retry_on_fail']:
+            reregistrations.append(election)
+            election['result'] = {'success': True, 'status': 'registration' if election['auto_start'] else 'scheduled'}
+        else:
+            failures.append(election['id'])
+            election['result'] = {'success': True, 'status': 'failed'}
+    
+    if winners:
+        execute_values(
+            cursor,
+            """
+            UPDATE elections e SET status = 'completed', current_winner = w.user_name, winner_user_id = w.user_id,
+                winner_user_ids = w.user_ids, term_end_date = w.term_end, transition_lease_until = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS w (id, user_name, user_id, user_ids, term_end)
+            WHERE e.id = w.id
+            """,
+            winners, template='(%s, %s, %s, %s::text[], %s::timestamp)'
+        )
+        record_change_rows(cursor, 'status', [
+            (election_id, {'status': 'completed', 'winner': user_name, 'winnerUserIds': user_ids})
+            for election_id, user_name, _, user_ids, _ in winners
+        ])
     
-    if election['total_votes'] >= required_votes and winner:
-        term_end = datetime.now() + timedelta(hours=election['term_duration'])
+    if retries:
+        start_votings(cursor, retries, now)
+    
+    if reregistrations:
+        ids = [e['id'] for e in reregistrations]
+        reset_ballots(cursor, ids, candidates=True)
         cursor.execute(
-            "UPDATE elections SET status = 'completed', current_winner = %s, winner_user_id = %s, term_end_date = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
-            (winner['user_name'], winner['user_id'], term_end, election_id)
+            """
+            UPDATE elections SET voting_attempts = 0, transition_lease_until = NULL,
+                status = CASE WHEN auto_start THEN status ELSE 'scheduled' END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ANY(%s)
+            """,
+            (ids,)
         )
-        conn.commit()
-        cursor.close()
-        return {'success': True, 'winner': winner['user_name']}
-    else:
-        if election['retry_on_fail'] and election['voting_attempts'] < election['max_voting_attempts']:
-            cursor.close()
-            return api_start_voting(conn, election_id)
-        elif election['retry_on_fail']:
-            cursor.execute("UPDATE elections SET voting_attempts = 0 WHERE id = %s", (election_id,))
-            cursor.execute("DELETE FROM candidates WHERE election_id = %s", (election_id,))
-            cursor.execute("DELETE FROM votes WHERE election_id = %s", (election_id,))
-            conn.commit()
-            cursor.close()
-            return api_start_registration(conn, election_id) if election['auto_start'] else {'success': True}
-        else:
-            cursor.execute("UPDATE elections SET status = 'failed' WHERE id = %s", (election_id,))
-            conn.commit()
-            cursor.close()
-            return {'success': True, 'status': 'failed'}
+        restarted = [e['id'] for e in reregistrations if e['auto_start']]
+        start_registrations(cursor, restarted, now, payload={'candidatesReset': True})
+        record_changes(cursor, [e['id'] for e in reregistrations if not e['auto_start']], 'status', {'status': 'scheduled', 'candidatesReset': True})
+    
+    if failures:
+        cursor.execute(
+            "UPDATE elections SET status = 'failed', transition_lease_until = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = ANY(%s)",
+            (failures,)
+        )
+        record_changes(cursor, failures, 'status', {'status': 'failed'})
+    
+    return elections
+
+# Кандидат, добавленный во время голосования, сразу получает следующий номер в бюллетене.
+# Строки выборов заранее блокируются (FOR NO KEY UPDATE не мешает вставке голосов), поэтому
+# MAX(ballot_index) читается уже после параллельных добавлений и старта голосования
+NEXT_BALLOT_INDEX_SQL = """
+    CASE WHEN e.status = 'voting' THEN
+        (SELECT COALESCE(MAX(ballot_index), -1) FROM candidates WHERE election_id = e.id)
+        + row_number() OVER (PARTITION BY e.id ORDER BY v.id)
+    END
+"""
+
+def lock_elections(cursor, election_ids: List[str]):
+    cursor.execute(
+        "SELECT id FROM elections WHERE id = ANY(%s) ORDER BY id FOR NO KEY UPDATE",
+        (sorted(set(election_ids)),)
+    )
+    cursor.fetchall()
 
 def api_add_candidate(conn, data: Dict):
-    candidate_id = f"candidate_{int(datetime.now().timestamp() * 1000)}"
+    candidate_id = new_id('candidate')
     cursor = conn.cursor()
     
+    lock_elections(cursor, [data['electionId']])
     cursor.execute(
-        "INSERT INTO candidates (id, election_id, user_id, user_name, avatar, speech) VALUES (%s, %s, %s, %s, %s, %s)",
-        (candidate_id, data['electionId'], data['userId'], data['userName'], data.get('avatar', '👤'), data['speech'])
+        f"""
+        INSERT INTO candidates (id, election_id, user_id, user_name, avatar, speech, ballot_index)
+        SELECT v.id, e.id, %s, %s, %s, %s, {NEXT_BALLOT_INDEX_SQL}
+        FROM (VALUES (%s)) AS v (id) JOIN elections e ON e.id = %s
+        ON CONFLICT (election_id, user_id) DO NOTHING
+        """,
+        (data['userId'], data['userName'], data.get('avatar', '👤'), data['speech'], candidate_id, data['electionId'])
     )
+    if not cursor.rowcount:
+        conn.rollback()
+        cursor.close()
+        return {'error': 'Election not found or candidate already registered'}
+    record_change(cursor, data['electionId'], 'candidate_registered', {'candidateId': candidate_id, 'userId': data['userId'], 'userName': data['userName']})
     conn.commit()
     cursor.close()
+    invalidate_rendered_list(data['electionId'])
+    invalidate_candidate_index(data['electionId'])
     
     return {'success': True, 'candidateId': candidate_id}
 
+def api_bulk_add_candidates(conn, data: Dict):
+    items = data.get('candidates')
+    if not isinstance(items, list) or len(items) > BULK_MAX_ITEMS:
+        return {'error': f'candidates must be an array of at most {BULK_MAX_ITEMS} items'}
+    
+    errors, rows, indexes = [], [], []
+    seen = set()
+    for index, item in enumerate(items):
+        error = validate_bulk_item(item, CANDIDATE_REQUIRED_FIELDS, {'avatar': str})
+        if not error and (item['electionId'], item['userId']) in seen:
+            error = 'Duplicate candidate in request'
+        if error:
+            errors.append({'index': index, 'error': error})
+            continue
+        seen.add((item['electionId'], item['userId']))
+        rows.append((new_id('candidate'), item['electionId'], item['userId'], item['userName'], item.get('avatar', '👤'), item['speech']))
+        indexes.append(index)
+    
+    cursor = conn.cursor()
+    if rows:
+        lock_elections(cursor, [row[1] for row in rows])
+    inserted = execute_values(
+        cursor,
+        f"""
+        INSERT INTO candidates (id, election_id, user_id, user_name, avatar, speech, ballot_index)
+        SELECT v.id, v.election_id, v.user_id, v.user_name, v.avatar, v.speech, {NEXT_BALLOT_INDEX_SQL}
+        FROM (VALUES %s) AS v (id, election_id, user_id, user_name, avatar, speech)
+        JOIN elections e ON e.id = v.election_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM candidates c WHERE c.election_id = v.election_id AND c.user_id = v.user_id
+        )
+        ON CONFLICT (election_id, user_id) DO NOTHING
+        RETURNING id
+        """,
+        rows, page_size=BULK_PAGE_SIZE, fetch=True
+    ) if rows else []
+    created_ids = {row[0] for row in inserted}
+    record_change_rows(cursor, 'candidate_registered', [
+        (row[1], {'candidateId': row[0], 'userId': row[2], 'userName': row[3]}) for row in rows if row[0] in created_ids
+    ])
+    conn.commit()
+    cursor.close()
+    
+    created = []
+    for index, row in zip(indexes, rows):
+        if row[0] in created_ids:
+            created.append({'index': index, 'candidateId': row[0]})
+        else:
+            errors.append({'index': index, 'error': 'Election not found or candidate already registered'})
+    
+    for election_id in {row[1] for row in rows if row[0] in created_ids}:
+        invalidate_rendered_list(election_id)
+        invalidate_candidate_index(election_id)
+    
+    return {'success': True, 'created': created, 'errors': sorted(errors, key=lambda e: e['index'])}
+
 def api_remove_candidate(conn, candidate_id: str):
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM candidates WHERE id = %s", (candidate_id,))
+    cursor.execute("DELETE FROM candidates WHERE id = %s RETURNING election_id, user_id", (candidate_id,))
+    removed = cursor.fetchone()
+    if removed:
+        record_change(cursor, removed[0], 'candidate_withdrawn', {'candidateId': candidate_id, 'userId': removed[1]})
     conn.commit()
     cursor.close()
     
+    if removed:
+        invalidate_rendered_list(removed[0])
+        invalidate_candidate_index(removed[0])
+    
     return {'success': True}
 
 def api_cast_vote(conn, data: Dict):
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT * FROM votes WHERE election_id = %s AND user_id = %s", (data['electionId'], data['userId']))
-    
-    if cursor.fetchone():
+    ranking = data.get('ranking')
+    if ranking is not None:
+        if not isinstance(ranking, list) or not ranking or not all(isinstance(c, str) for c in ranking):
+            return {'error': 'ranking must be a non-empty array of candidate ids'}
+        if len(set(ranking)) != len(ranking):
+            return {'error': 'ranking must not repeat candidates'}
+        # Первое предпочтение — обычный голос за кандидата; остальные id проверяются до
+        # постановки в пачку, чтобы один неверный бюллетень не ждал окна батчера
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM candidates WHERE election_id = %s AND id = ANY(%s) AND ballot_index IS NOT NULL",
+            (data['electionId'], ranking)
+        )
+        known = cursor.fetchone()[0]
         cursor.close()
+        conn.rollback()
+        if known != len(ranking):
+            return {'error': 'ranking contains unknown candidates'}
+    
+    outcome = cast_vote(
+        conn, data['userId'], data['userName'],
+        election_id=data['electionId'], candidate_id=ranking[0] if ranking else data['candidateId'],
+        ranking=ranking
+    )
+    
+    if outcome['status'] == 'no_election':
+        return {'error': 'Election is not in voting phase'}
+    if outcome['status'] == 'no_candidate':
+        return {'error': 'Candidate not found'}
+    if outcome['status'] == 'invalid_ranking':
+        return {'error': 'ranking contains unknown candidates'}
+    if outcome['status'] == 'duplicate':
         return {'error': 'Already voted'}
     
+    return {'success': True}
+
+def api_scheduler_tick(conn, data: Dict):
+    '''
+    Один тик планировщика: одним запросом по индексу next_transition_at арендует до
+    limit просроченных выборов (FOR UPDATE SKIP LOCKED — параллельные воркеры берут
+    разные строки) и применяет переходы пачками по видам.
+    '''
+    now = datetime.now()
+    limit = parse_int_param('limit', data.get('limit'), SCHEDULER_BATCH_SIZE, 1, SCHEDULER_BATCH_SIZE)
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute(
-        "INSERT INTO votes (election_id, user_id, user_name, candidate_id) VALUES (%s, %s, %s, %s)",
-        (data['electionId'], data['userId'], data['userName'], data['candidateId'])
+        """
+        UPDATE elections SET transition_lease_until = %(now)s + make_interval(secs => %(lease)s)
+        WHERE id IN (
+            SELECT id FROM elections
+            WHERE next_transition_at <= %(now)s
+              AND (transition_lease_until IS NULL OR transition_lease_until < %(now)s)
+            ORDER BY next_transition_at
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, server_id, status
+        """,
+        {'now': now, 'lease': SCHEDULER_LEASE_SECONDS, 'limit': limit}
     )
-    cursor.execute("UPDATE candidates SET votes = votes + 1 WHERE id = %s", (data['candidateId'],))
-    cursor.execute("UPDATE elections SET total_votes = total_votes + 1 WHERE id = %s", (data['electionId'],))
+    claimed = cursor.fetchall()
     conn.commit()
+    
+    by_status: Dict[str, List[str]] = {}
+    for election in claimed:
+        by_status.setdefault(election['status'], []).append(election['id'])
+    
+    transitions = {'voting': 0, 'completed': 0, 'renewed': 0}
+    if by_status.get('registration'):
+        transitions['voting'] = len(start_votings(cursor, by_status['registration'], now, from_status='registration'))
+        conn.commit()
+    if by_status.get('completed'):
+        transitions['renewed'] = len(renew_terms(cursor, by_status['completed'], now))
+        conn.commit()
+    if by_status.get('voting'):
+        completed = complete_elections(cursor, by_status['voting'], now)
+        transitions['completed'] = sum(1 for e in completed if e['result'].get('success'))
+        conn.commit()
+    
+    if claimed:
+        cursor.execute(
+            "UPDATE elections SET transition_lease_until = NULL WHERE id = ANY(%s)",
+            ([e['id'] for e in claimed],)
+        )
+        conn.commit()
     cursor.close()
     
-    return {'success': True}
+    for election in claimed:
+        invalidate_active_elections(election['server_id'])
+        invalidate_rendered_list(election['id'])
+        invalidate_candidate_index(election['id'])
+    
+    compacted = compact_vote_tallies(conn)
+    pruned = prune_election_changes(conn, now)
+    return {
+        'success': True, 'claimed': len(claimed), 'transitions': transitions,
+        'compactedVotes': compacted, 'prunedChanges': pruned
+    }
 
-def ensure_server_exists(conn, guild_id: str, guild_name: str):
+def prune_election_changes(conn, now: datetime) -> int:
+    '''
+    Лента изменений хранится ELECTION_CHANGES_RETENTION_HOURS; каждый тик планировщика
+    удаляет не больше ELECTION_CHANGES_PRUNE_BATCH устаревших строк, чтобы не держать
+    долгую транзакцию. Клиенту, не опрашивавшему ленту дольше срока хранения, нужно
+    заново загрузить GET /elections.
+    '''
     cursor = conn.cursor()
     cursor.execute(
-        "INSERT INTO servers (id, name, member_count) VALUES (%s, %s, 0) ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name, updated_at = CURRENT_TIMESTAMP",
-        (guild_id, guild_name)
+        """
+        DELETE FROM election_changes WHERE seq IN (
+            SELECT seq FROM election_changes WHERE created_at < %s
+            ORDER BY created_at
+            LIMIT %s
+        )
+        """,
+        (now - timedelta(hours=ELECTION_CHANGES_RETENTION_HOURS), ELECTION_CHANGES_PRUNE_BATCH)
     )
+    pruned = cursor.rowcount
     conn.commit()
     cursor.close()
+    return pruned
+
+def ensure_server_exists(conn, guild_id: str, guild_name: str) -> bool:
+    known = _known_guilds.get(guild_id)
+    if known and known[0] == guild_name and time.monotonic() - known[1] < SERVER_REFRESH_INTERVAL:
+        return False
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO servers (id, name, member_count) VALUES (%s, %s, 0)
+        ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name, updated_at = CURRENT_TIMESTAMP
+        WHERE servers.name IS DISTINCT FROM EXCLUDED.name
+           OR servers.updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+        """,
+        (guild_id, guild_name, SERVER_REFRESH_INTERVAL)
+    )
+    cursor.close()
+    return True
+
+def remember_guild(guild_id: str, guild_name: str):
+    _known_guilds[guild_id] = (guild_name, time.monotonic())
 
 def api_register_discord_commands(data: Dict):
     import urllib.request
@@ -682,14 +2275,14 @@ def api_register_discord_commands(data: Dict):
                 "description": "Проголосовать за кандидата",
                 "type": 1,
                 "options": [
-                    {"name": "candidate", "description": "Выберите кандидата", "type": 6, "required": True}
+                    {"name": "candidate", "description": "Выберите кандидата", "type": 3, "required": True, "autocomplete": True}
                 ]
             },
             {"name": "list", "description": "Список всех кандидатов", "type": 1}
         ]
     }
     
-    url = f"https://discord.com/api/v10/applications/{application_id}/commands"
+    url = f"{DISCORD_API_BASE}/applications/{application_id}/commands"
     headers = {
         'Authorization': f'Bot {bot_token}',
         'Content-Type': 'application/json'
@@ -716,13 +2309,291 @@ def api_register_discord_commands(data: Dict):
     except Exception as e:
         return create_json_response({'success': False, 'error': str(e)}, 500)
 
+class BoundedConnectionPool(ThreadedConnectionPool):
+    '''
+    ThreadedConnectionPool, у которого getconn при занятом пуле ждёт освободившееся
+    соединение до DB_POOL_ACQUIRE_TIMEOUT секунд, а не сразу бросает PoolError.
+    '''
+    
+    def __init__(self, minconn: int, maxconn: int, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+    
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT):
+            raise PoolError('Database connection pool exhausted')
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+def get_db_pool() -> ThreadedConnectionPool:
+    global _db_pool
+    if _db_pool is None or _db_pool.closed:
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool.closed:
+                _db_pool = BoundedConnectionPool(
+                    DB_POOL_MIN, _db_pool_size, os.environ.get('DATABASE_URL', ''), connection_factory=TracedConnection
+                )
+    return _db_pool
+
+def open_db_pool(max_size: int, connection_factory=None) -> BoundedConnectionPool:
+    '''
+    Пул на max_size соединений вместо DB_POOL_MAX; вызывается при старте процесса,
+    до первого запроса. Уже открытый пул закрывается, get_db_pool дальше выдаёт новый.
+    '''
+    global _db_pool, _db_pool_size
+    with _db_pool_lock:
+        if _db_pool is not None and not _db_pool.closed:
+            _db_pool.closeall()
+        _db_pool_size = max_size
+        _db_pool = BoundedConnectionPool(
+            DB_POOL_MIN, max_size, os.environ.get('DATABASE_URL', ''), connection_factory=connection_factory or TracedConnection
+        )
+    return _db_pool
+
+def close_db_pool():
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is not None and not _db_pool.closed:
+            _db_pool.closeall()
+        _db_pool = None
+
+def is_connection_alive(conn) -> bool:
+    if conn.closed:
+        return False
+    
+    # После обрыва любого соединения (рестарт базы рвёт все сразу) проверяются и те,
+    # что простаивали меньше DB_POOL_PING_AFTER
+    last_used = _db_conn_last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL_PING_AFTER and last_used > _db_conn_failed_at:
+        return True
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
 def get_db_connection():
-    return psycopg2.connect(os.environ.get('DATABASE_URL', ''))
+    pool = get_db_pool()
+    for _ in range(pool.maxconn + 1):
+        conn = pool.getconn()
+        if is_connection_alive(conn):
+            conn.statements = 0
+            return conn
+        _db_conn_last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError('No live database connection available')
+
+def release_db_connection(conn):
+    global _db_conn_failed_at
+    pool = get_db_pool()
+    broken = bool(conn.closed)
+    
+    if not broken and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+    
+    if broken:
+        _db_conn_last_used.pop(id(conn), None)
+        _db_conn_failed_at = time.monotonic()
+    else:
+        _db_conn_last_used[id(conn)] = time.monotonic()
+    pool.putconn(conn, close=broken)
+
+@contextmanager
+def db_connection():
+    with trace_span('db_acquire'):
+        conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        release_db_connection(conn)
+
+def with_db_connection(work):
+    '''
+    work(conn) на соединении из пула. Если соединение оборвано сервером и упал самый
+    первый запрос, ничего ещё не выполнено: work повторяется один раз на новом соединении.
+    '''
+    for attempt in range(2):
+        with db_connection() as conn:
+            try:
+                return work(conn)
+            except psycopg2.OperationalError:
+                if attempt or not conn.closed or getattr(conn, 'statements', 0) > 1:
+                    raise
+
+class InvalidParameter(ValueError):
+    '''Неверный параметр запроса; handle_api_request отвечает на него 400, а не 500.'''
+
+def parse_int_param(name: str, value: Any, default: int, low: int, high: int) -> int:
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise InvalidParameter(f'{name} must be an integer')
+    try:
+        number = int(value)
+    except ValueError:
+        raise InvalidParameter(f'{name} must be an integer')
+    return max(low, min(number, high))
+
+def parse_page_limit(limit: str = None) -> int:
+    return parse_int_param('limit', limit, DEFAULT_PAGE_LIMIT, 1, MAX_PAGE_LIMIT)
+
+def encode_page_cursor(at: datetime, row_id: str) -> str:
+    return f"{at.isoformat()}|{row_id}"
+
+def decode_page_cursor(cursor: str = None) -> tuple:
+    '''
+    Курсор страницы — «время|id»: строки с одинаковым временем (пачка из одной транзакции)
+    не теряются на границе страниц. Курсор без id сравнивается с пустым id, то есть
+    работает как прежнее строгое «раньше этого времени».
+    '''
+    if not cursor:
+        return None, ''
+    at, _, row_id = cursor.partition('|')
+    try:
+        datetime.fromisoformat(at)
+    except ValueError:
+        raise InvalidParameter('before must be a cursor returned as nextCursor')
+    return at, row_id
+
+def start_trace() -> Dict[str, Any]:
+    trace = {
+        'name': 'unknown',
+        'started': time.perf_counter(),
+        'sampled': TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE,
+        'spans': {},
+        'queries': 0,
+        'statements': []
+    }
+    _current_trace.set(trace)
+    return trace
+
+def set_trace_name(name: str):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace['name'] = name
+
+@contextmanager
+def trace_span(name: str):
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace['spans'][name] = trace['spans'].get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+def record_query(trace: Dict[str, Any], query, elapsed_ms: float):
+    trace['queries'] += 1
+    trace['spans']['sql'] = trace['spans'].get('sql', 0.0) + elapsed_ms
+    if trace['sampled'] and len(trace['statements']) < TRACE_MAX_STATEMENTS:
+        text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        trace['statements'].append({'sql': ' '.join(text.split())[:80], 'ms': round(elapsed_ms, 3)})
+
+def traced_cursor_class(base: type) -> type:
+    cls = _traced_cursor_classes.get(base)
+    if cls is None:
+        def execute(self, query, vars=None):
+            self.connection.statements = getattr(self.connection, 'statements', 0) + 1
+            trace = _current_trace.get()
+            if trace is None:
+                return base.execute(self, query, vars)
+            started = time.perf_counter()
+            try:
+                return base.execute(self, query, vars)
+            finally:
+                record_query(trace, query, (time.perf_counter() - started) * 1000)
+        
+        cls = type(f'Traced{base.__name__}', (base,), {'execute': execute})
+        _traced_cursor_classes[base] = cls
+    return cls
+
+class TracedConnection(psycopg2.extensions.connection):
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = traced_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+def finish_trace(trace: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    total_ms = (time.perf_counter() - trace['started']) * 1000
+    spans = trace['spans']
+    spans['logic'] = max(total_ms - sum(spans.values()), 0.0)
+    record_histogram(trace['name'], total_ms, trace['queries'])
+    
+    if trace['sampled']:
+        print(json.dumps({
+            'trace': trace['name'],
+            'status': response.get('statusCode'),
+            'totalMs': round(total_ms, 3),
+            'spans': {name: round(ms, 3) for name, ms in spans.items()},
+            'queries': trace['queries'],
+            'statements': trace['statements']
+        }, ensure_ascii=False))
+        timings = [f"{name};dur={ms:.2f}" for name, ms in spans.items()]
+        timings.append(f"total;dur={total_ms:.2f}")
+        headers = response.setdefault('headers', {})
+        headers['Server-Timing'] = ', '.join(timings)
+        exposed = headers.get('Access-Control-Expose-Headers')
+        headers['Access-Control-Expose-Headers'] = f"{exposed}, Server-Timing" if exposed else 'Server-Timing'
+    
+    return response
+
+def record_histogram(name: str, total_ms: float, queries: int):
+    with _histograms_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            if len(_histograms) >= HISTOGRAM_MAX_SERIES:
+                name = 'other'
+                histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = {'count': 0, 'sumMs': 0.0, 'queries': 0, 'buckets': [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)}
+            _histograms[name] = histogram
+        histogram['count'] += 1
+        histogram['sumMs'] += total_ms
+        histogram['queries'] += queries
+        histogram['buckets'][bisect.bisect_left(HISTOGRAM_BUCKETS_MS, total_ms)] += 1
+
+def api_get_metrics():
+    with _histograms_lock:
+        return {
+            'bucketsMs': list(HISTOGRAM_BUCKETS_MS) + ['+Inf'],
+            'histograms': {
+                name: {
+                    'count': h['count'],
+                    'avgMs': round(h['sumMs'] / h['count'], 3),
+                    'queriesPerRequest': round(h['queries'] / h['count'], 2),
+                    'buckets': list(h['buckets'])
+                }
+                for name, h in _histograms.items()
+            }
+        }
 
 def create_json_response(data: Dict, status: int = 200):
+    with trace_span('serialize'):
+        body = json.dumps(data)
     return {
         'statusCode': status,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps(data),
+        'body': body,
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+get_verify_key(os.environ.get('DISCORD_PUBLIC_KEY', ''))
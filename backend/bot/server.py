@@ -0,0 +1,344 @@
+'''
+Business: Долгоживущий HTTP-сервер для handler из index.py вместо serverless-вызовов
+Args: те же запросы, что и у функции (Discord interactions, REST API), плюс GET /elections/stream
+Returns: ответы handler; выгрузка голосов и SSE отдаются потоком
+
+Запросы принимаются на asyncio-цикле и превращаются в event той же формы, что даёт
+poehali.dev; сам handler блокирующий и выполняется в ограниченном пуле потоков с общим
+пулом соединений Postgres. Выгрузка GET /elections/voters/export пишет COPY прямо в
+сокет, GET /elections/stream обслуживается общим LISTEN-соединением из stream.py.
+По SIGTERM сервер перестаёт принимать соединения, закрывает простаивающие и SSE,
+дожидается начатых запросов (не дольше SERVER_SHUTDOWN_TIMEOUT) и отложенных ответов Discord.
+
+Запуск:
+    DATABASE_URL=... DISCORD_PUBLIC_KEY=... python backend/bot/server.py --host 0.0.0.0 --port 8080
+'''
+import argparse
+import asyncio
+import base64
+import json
+import os
+import secrets
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from types import SimpleNamespace
+from typing import Dict, Optional, Set
+from urllib.parse import parse_qs, parse_qsl, urlsplit
+
+import index
+import stream
+
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', '16'))
+SERVER_MAX_BODY_BYTES = int(os.environ.get('SERVER_MAX_BODY_BYTES', str(1024 * 1024)))
+SERVER_KEEPALIVE_SECONDS = float(os.environ.get('SERVER_KEEPALIVE_SECONDS', '5'))
+SERVER_SHUTDOWN_TIMEOUT = float(os.environ.get('SERVER_SHUTDOWN_TIMEOUT', '30'))
+MAX_HEADER_LINES = 100
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_ROUTE = '/elections/voters/export'
+
+
+class BadRequest(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.url = urlsplit(target)
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    def header(self, name: str) -> str:
+        return next((v for k, v in self.headers.items() if k.lower() == name), '')
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.header('connection').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    def to_event(self) -> Dict:
+        return {
+            'httpMethod': self.method,
+            'path': self.url.path or '/',
+            'queryStringParameters': dict(parse_qsl(self.url.query, keep_blank_values=True)),
+            'headers': self.headers,
+            'body': self.body.decode('utf-8', errors='replace'),
+            'isBase64Encoded': False,
+            'requestContext': {'httpMethod': self.method}
+        }
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise BadRequest(400, 'Malformed request line')
+    method, target, version = parts
+
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, sep, value = line.decode('latin-1').partition(':')
+        if not sep:
+            raise BadRequest(400, 'Malformed header')
+        name, value = name.strip(), value.strip()
+        headers[name] = f'{headers[name]}, {value}' if name in headers else value
+    else:
+        raise BadRequest(431, 'Too many headers')
+
+    request = Request(method, target, version, headers, b'')
+    if request.header('transfer-encoding'):
+        raise BadRequest(411, 'Content-Length is required')
+    length = request.header('content-length') or '0'
+    if not length.isdigit():
+        raise BadRequest(400, 'Invalid Content-Length')
+    if int(length) > SERVER_MAX_BODY_BYTES:
+        raise BadRequest(413, 'Request body too large')
+    request.body = await reader.readexactly(int(length)) if int(length) else b''
+    return request
+
+
+def encode_head(status: int, headers: Dict[str, str]) -> bytes:
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = 'Unknown'
+    lines = [f'HTTP/1.1 {status} {reason}'] + [f'{k}: {v}' for k, v in headers.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+def encode_response(response: Dict, keep_alive: bool) -> bytes:
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        payload = base64.b64decode(body)
+    else:
+        payload = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8')
+    headers = {str(k): str(v) for k, v in (response.get('headers') or {}).items()}
+    headers['Content-Length'] = str(len(payload))
+    headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+    return encode_head(int(response.get('statusCode', 200)), headers) + payload
+
+
+def error_response(status: int, message: str) -> Dict:
+    return index.create_json_response({'error': message}, status)
+
+
+class ChunkedSink:
+    '''
+    Файл для copy_expert в рабочем потоке: строки COPY копятся в буфер и уходят клиенту
+    chunk'ами, каждая отправка ждёт drain — медленный клиент притормаживает COPY, а не
+    копит выгрузку в памяти. Заголовки отправляются с первым chunk'ом, поэтому ошибка
+    до первых данных ещё может стать обычным ответом 500.
+    '''
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter, head: bytes):
+        self.loop = loop
+        self.writer = writer
+        self.head = head
+        self.started = False
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data.encode('utf-8') if isinstance(data, str) else data
+        if len(self.buffer) >= EXPORT_CHUNK_BYTES:
+            self.flush()
+
+    def flush(self, last: bool = False):
+        chunk, self.buffer = bytes(self.buffer), bytearray()
+        asyncio.run_coroutine_threadsafe(self._send(chunk, last), self.loop).result()
+
+    async def _send(self, chunk: bytes, last: bool):
+        if not self.started:
+            self.writer.write(self.head)
+            self.started = True
+        if chunk:
+            self.writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+        if last:
+            self.writer.write(b'0\r\n\r\n')
+        await self.writer.drain()
+
+
+class HandlerServer:
+    def __init__(self, workers: int, dsn: str):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='handler')
+        self.listener = stream.ChangeListener(dsn) if dsn else None
+        self.connections: Set[asyncio.Task] = set()
+        self.idle: Set[asyncio.Task] = set()
+        self.streams: Set[asyncio.Task] = set()
+        self.closing = False
+
+    async def start(self):
+        # Каждый рабочий поток держит одно соединение, ещё по одному — потоки отложенных
+        # ответов Discord; пул нужного размера создаётся до первого запроса
+        pool_size = max(index.DB_POOL_MAX, self.workers + index.DISCORD_FOLLOWUP_WORKERS)
+        await asyncio.get_running_loop().run_in_executor(None, index.open_db_pool, pool_size)
+        if self.listener is not None:
+            await self.listener.start()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while not self.closing:
+                self.idle.add(task)
+                try:
+                    request = await asyncio.wait_for(read_request(reader), SERVER_KEEPALIVE_SECONDS)
+                except BadRequest as e:
+                    writer.write(encode_response(error_response(e.status, str(e)), keep_alive=False))
+                    await writer.drain()
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                finally:
+                    self.idle.discard(task)
+                if request is None or not await self.respond(request, reader, writer):
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections.discard(task)
+            self.streams.discard(task)
+            writer.close()
+
+    async def respond(self, request: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        path = request.url.path.rstrip('/')
+        if request.method == 'GET' and path.endswith('/elections/stream') and self.listener is not None:
+            server_id = parse_qs(request.url.query).get('server_id', [''])[0]
+            if not server_id:
+                writer.write(encode_response(error_response(400, 'server_id is required'), keep_alive=False))
+                await writer.drain()
+                return False
+            self.streams.add(asyncio.current_task())
+            await stream.stream_changes(self.listener, server_id, reader, writer)
+            return False
+
+        keep_alive = request.keep_alive and not self.closing
+        if request.method == 'GET' and index.resolve_api_path(path or '/') == EXPORT_ROUTE:
+            streamed = await self.stream_export(request, writer, keep_alive)
+            if streamed is not None:
+                return streamed and keep_alive
+
+        response = await self.call_handler(request.to_event())
+        writer.write(encode_response(response, keep_alive and not self.closing))
+        await writer.drain()
+        return keep_alive and not self.closing
+
+    async def call_handler(self, event: Dict) -> Dict:
+        loop = asyncio.get_running_loop()
+        context = SimpleNamespace(request_id=secrets.token_hex(8), function_name='bot')
+        try:
+            return await loop.run_in_executor(self.executor, index.handler, event, context)
+        except Exception as e:
+            print(f"Handler error: {e}")
+            return error_response(500, 'Internal server error')
+
+    async def stream_export(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> Optional[bool]:
+        query = dict(parse_qsl(request.url.query, keep_blank_values=True))
+        election_id = query.get('election_id')
+        fmt = query.get('format', 'ndjson')
+        if not election_id or fmt not in index.VOTER_EXPORT_FORMATS:
+            # Ошибки параметров отдаёт обычный маршрут handler
+            return None
+
+        head = encode_head(200, {
+            'Content-Type': index.VOTER_EXPORT_FORMATS[fmt][0],
+            'Content-Disposition': f'attachment; filename="{election_id}-voters.{fmt}"',
+            'Access-Control-Allow-Origin': '*',
+            'Transfer-Encoding': 'chunked',
+            'Connection': 'keep-alive' if keep_alive else 'close'
+        })
+        sink = ChunkedSink(asyncio.get_running_loop(), writer, head)
+
+        def export():
+            with index.db_connection() as conn:
+                index.export_voters(conn, election_id, fmt, sink)
+            sink.flush(last=True)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, export)
+        except ConnectionError:
+            return False
+        except Exception as e:
+            print(f"Voter export error: {e}")
+            if sink.started:
+                # Оборванный chunked-ответ клиент видит как незавершённую выгрузку
+                return False
+            writer.write(encode_response(error_response(500, str(e)), keep_alive=False))
+            await writer.drain()
+            return False
+        return True
+
+    async def shutdown(self, server: asyncio.AbstractServer):
+        self.closing = True
+        server.close()
+        for task in self.idle | self.streams:
+            task.cancel()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SERVER_SHUTDOWN_TIMEOUT
+        if self.connections:
+            _, pending = await asyncio.wait(self.connections, timeout=SERVER_SHUTDOWN_TIMEOUT)
+            if pending:
+                print(f"Shutdown timeout: dropping {len(pending)} connections")
+                for task in pending:
+                    task.cancel()
+
+        if self.listener is not None:
+            self.listener.close()
+
+        # Пул закрывается только после того, как остановились все потоки, которые им пользуются
+        workers = loop.run_in_executor(None, self.join_workers)
+        try:
+            await asyncio.wait_for(asyncio.shield(workers), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            print("Shutdown timeout: workers still running, leaving connections to process exit")
+            return
+        index.close_db_pool()
+
+    def join_workers(self):
+        # Рабочие потоки ещё могут поставить отложенный ответ Discord, поэтому они первыми
+        self.executor.shutdown(wait=True)
+        index.shutdown_followup_executor()
+
+
+async def serve(host: str, port: int, workers: int, dsn: str):
+    app = HandlerServer(workers, dsn)
+    await app.start()
+    server = await asyncio.start_server(app.handle_connection, host, port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"Bot server listening on {host}:{port} with {workers} workers")
+    await stop.wait()
+    print("Draining in-flight requests")
+    await app.shutdown(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-running HTTP server for the bot handler')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS)
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL', ''))
+    args = parser.parse_args()
+    if args.dsn:
+        os.environ['DATABASE_URL'] = args.dsn
+    asyncio.run(serve(args.host, args.port, args.workers, args.dsn))
+
+
+if __name__ == '__main__':
+    main()
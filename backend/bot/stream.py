@@ -0,0 +1,323 @@
+'''
+Business: Трансляция изменений выборов в дашборд через Server-Sent Events
+Args: GET /elections/stream?server_id=<id> — долгоживущее SSE-соединение
+Returns: события `changes` с изменившимися выборами и видами изменений
+
+Один процесс держит одно LISTEN-соединение с Postgres и подписывается на канал
+сервера, пока у него есть хотя бы один подписчик. Уведомления приходят из триггера
+на election_changes для всех изменений, кроме голосов: NOTIFY сериализует коммиты,
+поэтому голоса раз в STREAM_COALESCE_MS забираются опросом election_changes по
+подписанным серверам. Всплески склеиваются в одно событие на окно STREAM_COALESCE_MS.
+За самими изменениями клиент ходит в GET /elections/changes.
+
+Запуск:
+    DATABASE_URL=... python backend/bot/stream.py --host 0.0.0.0 --port 8081
+'''
+import argparse
+import asyncio
+import json
+import os
+from typing import Dict, Set
+from urllib.parse import parse_qs, urlsplit
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import sql
+
+CHANNEL_PREFIX = 'election_changes_'
+STREAM_COALESCE_MS = float(os.environ.get('STREAM_COALESCE_MS', '250'))
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', '15'))
+STREAM_RECONNECT_SECONDS = 2.0
+
+# Голоса транзакций с txid ниже xmin снимка: все они завершены, и ни один голос из
+# диапазона [after, horizon) не появится позже — следующий опрос начинается с horizon
+VOTE_CHANGES_SQL = """
+    WITH horizon AS (SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin)
+    SELECT h.xmin AS horizon, c.server_id, c.election_id FROM horizon h
+    LEFT JOIN LATERAL (
+        SELECT DISTINCT server_id, election_id FROM election_changes
+        WHERE server_id = ANY(%(servers)s) AND kind = 'vote'
+          AND txid >= %(after)s AND txid < h.xmin
+    ) c ON TRUE
+"""
+
+
+class Subscriber:
+    def __init__(self):
+        self.pending: Dict[str, Set[str]] = {}
+        self.wakeup = asyncio.Event()
+
+    def push(self, election_id: str, kind: str):
+        self.pending.setdefault(election_id, set()).add(kind)
+        self.wakeup.set()
+
+    def drain(self) -> Dict[str, list]:
+        pending, self.pending = self.pending, {}
+        self.wakeup.clear()
+        return {election_id: sorted(kinds) for election_id, kinds in pending.items()}
+
+
+class ChangeListener:
+    '''
+    Общее на процесс LISTEN-соединение; каналы подписываются по первому
+    подписчику сервера и отписываются по последнему. Подключение, LISTEN и UNLISTEN —
+    блокирующие вызовы psycopg2, поэтому идут в пуле потоков под asyncio.Lock: цикл
+    событий не ждёт базу, а LISTEN и UNLISTEN одного канала не перемежаются. Пока
+    соединение занято потоком, цикл не читает его сокет; уведомления, пришедшие за это
+    время, psycopg2 складывает в conn.notifies, и они разбираются сразу после вызова.
+    '''
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.conn = None
+        self.poll_conn = None
+        self.vote_cursor = 0
+        self.subscribers: Dict[str, Set[Subscriber]] = {}
+        self._loop = None
+        self._lock = asyncio.Lock()
+        self._poll_task = None
+        self._reconnect_task = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        async with self._lock:
+            await self._connect()
+        self.vote_cursor = (await self._loop.run_in_executor(None, self._fetch_votes, [], 0))[0]
+        self._poll_task = asyncio.ensure_future(self._poll_votes())
+
+    def close(self):
+        for task in (self._poll_task, self._reconnect_task):
+            if task is not None:
+                task.cancel()
+        self._poll_task = self._reconnect_task = None
+        self._drop_connection()
+        if self.poll_conn is not None:
+            self.poll_conn.close()
+            self.poll_conn = None
+
+    async def subscribe(self, server_id: str) -> Subscriber:
+        subscriber = Subscriber()
+        async with self._lock:
+            subscribers = self.subscribers.setdefault(server_id, set())
+            if not subscribers:
+                await self._execute(sql.SQL('LISTEN {}').format(sql.Identifier(CHANNEL_PREFIX + server_id)))
+            subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, server_id: str, subscriber: Subscriber):
+        subscribers = self.subscribers.get(server_id)
+        if not subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            # Отписка идёт отдельной задачей: её вызывают из finally отменённого потока SSE
+            asyncio.ensure_future(self._unlisten(server_id))
+
+    async def _unlisten(self, server_id: str):
+        async with self._lock:
+            if self.subscribers.get(server_id):
+                return
+            self.subscribers.pop(server_id, None)
+            await self._execute(sql.SQL('UNLISTEN {}').format(sql.Identifier(CHANNEL_PREFIX + server_id)))
+
+    async def _connect(self):
+        self.conn = await self._loop.run_in_executor(None, self._open, list(self.subscribers))
+        self._loop.add_reader(self.conn.fileno(), self._on_readable)
+        self._dispatch_notifies()
+
+    def _open(self, server_ids: list):
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = conn.cursor()
+        for server_id in server_ids:
+            cursor.execute(sql.SQL('LISTEN {}').format(sql.Identifier(CHANNEL_PREFIX + server_id)))
+        cursor.close()
+        return conn
+
+    async def _execute(self, statement):
+        conn = self.conn
+        if conn is None:
+            return
+        self._loop.remove_reader(conn.fileno())
+        try:
+            await self._loop.run_in_executor(None, self._run, conn, statement)
+        except psycopg2.Error as e:
+            print(f"Stream listener error: {e}")
+            self._schedule_reconnect()
+            return
+        if self.conn is conn:
+            self._loop.add_reader(conn.fileno(), self._on_readable)
+            self._dispatch_notifies()
+
+    @staticmethod
+    def _run(conn, statement):
+        cursor = conn.cursor()
+        cursor.execute(statement)
+        cursor.close()
+
+    def _on_readable(self):
+        try:
+            self.conn.poll()
+        except psycopg2.Error as e:
+            print(f"Stream listener error: {e}")
+            self._schedule_reconnect()
+            return
+        self._dispatch_notifies()
+
+    def _dispatch_notifies(self):
+        while self.conn.notifies:
+            notify = self.conn.notifies.pop(0)
+            server_id = notify.channel[len(CHANNEL_PREFIX):]
+            try:
+                payload = json.loads(notify.payload)
+            except ValueError:
+                continue
+            for subscriber in self.subscribers.get(server_id, ()):
+                subscriber.push(payload.get('electionId', ''), payload.get('kind', ''))
+
+    async def _poll_votes(self):
+        while True:
+            await asyncio.sleep(STREAM_COALESCE_MS / 1000)
+            if not self.subscribers:
+                continue
+            try:
+                horizon, rows = await self._loop.run_in_executor(
+                    None, self._fetch_votes, list(self.subscribers), self.vote_cursor
+                )
+            except psycopg2.Error as e:
+                print(f"Stream vote poll error: {e}")
+                if self.poll_conn is not None:
+                    self.poll_conn.close()
+                    self.poll_conn = None
+                continue
+
+            self.vote_cursor = max(self.vote_cursor, horizon)
+            for server_id, election_id in rows:
+                for subscriber in self.subscribers.get(server_id, ()):
+                    subscriber.push(election_id, 'vote')
+
+    def _fetch_votes(self, servers: list, after: int):
+        if self.poll_conn is None or self.poll_conn.closed:
+            self.poll_conn = psycopg2.connect(self.dsn)
+            self.poll_conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = self.poll_conn.cursor()
+        cursor.execute(VOTE_CHANGES_SQL, {'servers': servers, 'after': after})
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows[0][0], [(server_id, election_id) for _, server_id, election_id in rows if server_id is not None]
+
+    def _drop_connection(self):
+        if self.conn is None:
+            return
+        self._loop.remove_reader(self.conn.fileno())
+        try:
+            self.conn.close()
+        except psycopg2.Error:
+            pass
+        self.conn = None
+
+    def _schedule_reconnect(self):
+        self._drop_connection()
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self):
+        while True:
+            await asyncio.sleep(STREAM_RECONNECT_SECONDS)
+            async with self._lock:
+                try:
+                    await self._connect()
+                    break
+                except psycopg2.Error as e:
+                    print(f"Stream reconnect failed: {e}")
+
+        for subscribers in self.subscribers.values():
+            for subscriber in subscribers:
+                subscriber.push('', 'resync')
+
+
+async def stream_changes(listener: ChangeListener, server_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    writer.write(
+        b'HTTP/1.1 200 OK\r\n'
+        b'Content-Type: text/event-stream\r\n'
+        b'Cache-Control: no-cache\r\n'
+        b'Connection: keep-alive\r\n'
+        b'Access-Control-Allow-Origin: *\r\n'
+        b'\r\n'
+        b'retry: 3000\n\n'
+    )
+    await writer.drain()
+
+    subscriber = await listener.subscribe(server_id)
+    disconnected = asyncio.ensure_future(reader.read())
+    try:
+        while not disconnected.done():
+            wakeup = asyncio.ensure_future(subscriber.wakeup.wait())
+            done, _ = await asyncio.wait({wakeup, disconnected}, timeout=STREAM_HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                wakeup.cancel()
+                break
+
+            if wakeup not in done:
+                wakeup.cancel()
+                writer.write(b': ping\n\n')
+            else:
+                await asyncio.sleep(STREAM_COALESCE_MS / 1000)
+                data = json.dumps({'elections': subscriber.drain()}, separators=(',', ':'))
+                writer.write(f'event: changes\ndata: {data}\n\n'.encode('utf-8'))
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        disconnected.cancel()
+        listener.unsubscribe(server_id, subscriber)
+        writer.close()
+
+
+async def handle_connection(listener: ChangeListener, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+    except ConnectionError:
+        writer.close()
+        return
+
+    if len(request_line) < 2 or request_line[0] != 'GET':
+        writer.write(b'HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n')
+        writer.close()
+        return
+
+    url = urlsplit(request_line[1])
+    server_id = parse_qs(url.query).get('server_id', [''])[0]
+    if not url.path.rstrip('/').endswith('/elections/stream') or not server_id:
+        writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+        writer.close()
+        return
+
+    await stream_changes(listener, server_id, reader, writer)
+
+
+async def serve(host: str, port: int, dsn: str):
+    listener = ChangeListener(dsn)
+    await listener.start()
+    server = await asyncio.start_server(lambda r, w: handle_connection(listener, r, w), host, port)
+    print(f"Election stream listening on {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Server-Sent Events stream of election changes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL', ''))
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.dsn))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+'''
+Подсчёт итогов выборов: относительное большинство на N мест (fptp), мгновенный
+второй тур (irv) и передаваемый голос (stv, квота Друпа, дробный перенос излишка).
+
+Бюллетени — матрица индексов кандидатов (строка = бюллетень, столбцы = предпочтения
+по порядку, -1 = пусто) и веса строк (одинаковые бюллетени приходят из базы
+сгруппированными). Если установлен NumPy, раунды считаются векторно; иначе работает
+эталонная реализация на чистом Python с теми же результатами.
+
+Ничьи решаются детерминированно по priority: меньше — выше приоритет (порядок
+регистрации). При выборе победителя выигрывает кандидат с меньшим priority,
+при исключении выбывает кандидат с большим.
+'''
+from itertools import chain
+from typing import Dict, List, Optional, Sequence
+
+METHODS = ('fptp', 'irv', 'stv')
+
+_numpy = None
+
+
+def load_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def elect(method: str, ballots, n_candidates: int, seats: int = 1, weights: Sequence[float] = None,
+          priority: Sequence[int] = None, vectorized: Optional[bool] = None) -> List[int]:
+    if method not in METHODS:
+        raise ValueError(f'Unknown voting method: {method}')
+    if n_candidates == 0:
+        return []
+
+    seats = 1 if method == 'irv' else max(1, min(seats, n_candidates))
+    priority = list(priority) if priority is not None else list(range(n_candidates))
+    np = load_numpy() if vectorized is not False else None
+    if vectorized and np is None:
+        raise RuntimeError('NumPy is not installed')
+
+    if np is not None:
+        matrix = ballot_matrix(np, ballots)
+        row_weights = np.ones(len(matrix)) if weights is None else np.asarray(weights, dtype=np.float64)
+        return VECTORIZED[method](np, matrix, row_weights, n_candidates, seats, priority)
+
+    rows = [list(b) for b in ballots]
+    row_weights = [1.0] * len(rows) if weights is None else [float(w) for w in weights]
+    return REFERENCE[method](rows, row_weights, n_candidates, seats, priority)
+
+
+def parse_ballots(values: str, weights: str, width: int, remap: Dict[int, int], vectorized: Optional[bool] = None):
+    '''
+    Сгруппированные бюллетени в том виде, в каком их отдаёт база: values — номера
+    кандидатов через запятую, по width на бюллетень (-1 — пусто), weights — число
+    одинаковых бюллетеней. remap переводит номер в бюллетене в индекс кандидата;
+    номера без кандидата становятся -1. С NumPy разбор и перевод идут целыми массивами,
+    без цикла по бюллетеням.
+    '''
+    if not values or not width:
+        return [], []
+    np = load_numpy() if vectorized is not False else None
+    if vectorized and np is None:
+        raise RuntimeError('NumPy is not installed')
+
+    if np is not None:
+        raw = np.fromstring(values, dtype=np.int64, sep=',')
+        lookup = np.full(max(max(remap, default=-1), int(raw.max())) + 2, -1, dtype=np.int16)
+        lookup[list(remap)] = list(remap.values())
+        # -1 (пусто) берёт последний элемент lookup, который всегда -1
+        return lookup[raw].reshape(-1, width), np.fromstring(weights, dtype=np.float64, sep=',')
+
+    raw = [remap.get(int(v), -1) for v in values.split(',')]
+    rows = [[c for c in raw[i:i + width] if c >= 0] for i in range(0, len(raw), width)]
+    return rows, [float(w) for w in weights.split(',')]
+
+
+def ballot_matrix(np, ballots):
+    if isinstance(ballots, np.ndarray):
+        return ballots.reshape(len(ballots), -1) if ballots.ndim == 1 else ballots
+    lengths = np.fromiter(map(len, ballots), dtype=np.int64, count=len(ballots))
+    width = int(lengths.max(initial=0)) or 1
+    matrix = np.full((len(ballots), width), -1, dtype=np.int16)
+    matrix[np.arange(width) < lengths[:, None]] = np.fromiter(
+        chain.from_iterable(ballots), dtype=np.int16, count=int(lengths.sum())
+    )
+    return matrix
+
+
+def best(candidates, counts, priority) -> int:
+    return min(candidates, key=lambda c: (-round(float(counts[c]), 9), priority[c]))
+
+
+def worst(candidates, counts, priority) -> int:
+    return min(candidates, key=lambda c: (round(float(counts[c]), 9), -priority[c]))
+
+
+def ranked(candidates, counts, priority) -> List[int]:
+    return sorted(candidates, key=lambda c: (-round(float(counts[c]), 9), priority[c]))
+
+
+def current_choices(np, matrix, active, rows=None):
+    ballots = matrix if rows is None else matrix[rows]
+    valid = (ballots >= 0) & active[np.maximum(ballots, 0)]
+    column = valid.argmax(axis=1)
+    choices = ballots[np.arange(len(ballots)), column]
+    return np.where(valid.any(axis=1), choices, -1)
+
+
+def tally_choices(np, choices, weights, n_candidates):
+    live = choices >= 0
+    return np.bincount(choices[live], weights=weights[live], minlength=n_candidates)
+
+
+def transfer(np, matrix, weights, active, choices, counts, candidate):
+    # Пересчитываются только бюллетени выбывшего кандидата, а не вся матрица
+    moved = np.flatnonzero(choices == candidate)
+    choices[moved] = current_choices(np, matrix, active, moved)
+    counts[candidate] = 0
+    counts += tally_choices(np, choices[moved], weights[moved], len(counts))
+
+
+def fptp_vectorized(np, matrix, weights, n_candidates, seats, priority):
+    counts = tally_choices(np, matrix[:, 0], weights, n_candidates) if len(matrix) else np.zeros(n_candidates)
+    return [int(c) for c in ranked(range(n_candidates), counts, priority)[:seats]]
+
+
+def irv_vectorized(np, matrix, weights, n_candidates, seats, priority):
+    active = np.ones(n_candidates, dtype=bool)
+    choices = current_choices(np, matrix, active)
+    counts = tally_choices(np, choices, weights, n_candidates)
+    while True:
+        remaining = [int(c) for c in np.flatnonzero(active)]
+        if len(remaining) == 1:
+            return remaining
+        leader = best(remaining, counts, priority)
+        if counts[leader] * 2 > counts.sum():
+            return [leader]
+        loser = worst(remaining, counts, priority)
+        active[loser] = False
+        transfer(np, matrix, weights, active, choices, counts, loser)
+
+
+def stv_vectorized(np, matrix, weights, n_candidates, seats, priority):
+    weights = weights.astype(np.float64, copy=True)
+    quota = float(weights.sum() // (seats + 1) + 1)
+    active = np.ones(n_candidates, dtype=bool)
+    choices = current_choices(np, matrix, active)
+    counts = tally_choices(np, choices, weights, n_candidates)
+    elected: List[int] = []
+    while len(elected) < seats:
+        remaining = [int(c) for c in np.flatnonzero(active)]
+        if len(remaining) <= seats - len(elected):
+            elected.extend(ranked(remaining, counts, priority))
+            break
+        leader = best(remaining, counts, priority)
+        if counts[leader] >= quota:
+            elected.append(leader)
+            active[leader] = False
+            weights[choices == leader] *= (counts[leader] - quota) / counts[leader]
+            transfer(np, matrix, weights, active, choices, counts, leader)
+        else:
+            loser = worst(remaining, counts, priority)
+            active[loser] = False
+            transfer(np, matrix, weights, active, choices, counts, loser)
+    return elected
+
+
+def current_choices_reference(rows, active):
+    return [next((c for c in row if c >= 0 and active[c]), -1) for row in rows]
+
+
+def tally_choices_reference(choices, weights, n_candidates):
+    counts = [0.0] * n_candidates
+    for choice, weight in zip(choices, weights):
+        if choice >= 0:
+            counts[choice] += weight
+    return counts
+
+
+def fptp_reference(rows, weights, n_candidates, seats, priority):
+    counts = tally_choices_reference([row[0] if row else -1 for row in rows], weights, n_candidates)
+    return ranked(range(n_candidates), counts, priority)[:seats]
+
+
+def irv_reference(rows, weights, n_candidates, seats, priority):
+    active = [True] * n_candidates
+    while True:
+        remaining = [c for c in range(n_candidates) if active[c]]
+        if len(remaining) == 1:
+            return remaining
+        counts = tally_choices_reference(current_choices_reference(rows, active), weights, n_candidates)
+        leader = best(remaining, counts, priority)
+        if counts[leader] * 2 > sum(counts):
+            return [leader]
+        active[worst(remaining, counts, priority)] = False
+
+
+def stv_reference(rows, weights, n_candidates, seats, priority):
+    weights = list(weights)
+    quota = float(sum(weights) // (seats + 1) + 1)
+    active = [True] * n_candidates
+    elected: List[int] = []
+    while len(elected) < seats:
+        remaining = [c for c in range(n_candidates) if active[c]]
+        choices = current_choices_reference(rows, active)
+        counts = tally_choices_reference(choices, weights, n_candidates)
+        if len(remaining) <= seats - len(elected):
+            elected.extend(ranked(remaining, counts, priority))
+            break
+        leader = best(remaining, counts, priority)
+        if counts[leader] >= quota:
+            elected.append(leader)
+            active[leader] = False
+            factor = (counts[leader] - quota) / counts[leader]
+            weights = [w * factor if choice == leader else w for choice, w in zip(choices, weights)]
+        else:
+            active[worst(remaining, counts, priority)] = False
+    return elected
+
+
+VECTORIZED = {'fptp': fptp_vectorized, 'irv': irv_vectorized, 'stv': stv_vectorized}
+REFERENCE = {'fptp': fptp_reference, 'irv': irv_reference, 'stv': stv_reference}
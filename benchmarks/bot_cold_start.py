@@ -0,0 +1,125 @@
+'''
+Бенчмарк холодного старта backend/bot: время импорта index.py и первого запроса
+в свежем процессе интерпретатора.
+
+Запуск:
+    python benchmarks/bot_cold_start.py --runs 20 --output cold_start.json
+
+Первый запрос — подписанный Discord PING (без базы). Если задан DATABASE_URL,
+дополнительно замеряется первый GET /servers, включающий создание пула соединений.
+С --baseline результат сравнивается с прошлым прогоном; рост медианы больше чем на
+--max-regression завершает процесс с кодом 1.
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+from nacl.signing import SigningKey
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_DIR = os.path.join(ROOT, 'backend', 'bot')
+
+PROBE = r'''
+import os, sys, time
+sys.path.insert(0, sys.argv[1])
+
+# До таймера загружены только os, sys и time: json, nacl и всё остальное, что тянет
+# index, попадает в importMs
+started = time.perf_counter()
+import index
+import_ms = (time.perf_counter() - started) * 1000
+
+import json
+from nacl.signing import SigningKey
+
+signing_key = SigningKey(bytes.fromhex(sys.argv[2]))
+body = json.dumps({'type': 1})
+timestamp = str(int(time.time()))
+event = {
+    'httpMethod': 'POST',
+    'path': '/',
+    'headers': {
+        'X-Signature-Ed25519': signing_key.sign((timestamp + body).encode()).signature.hex(),
+        'X-Signature-Timestamp': timestamp,
+    },
+    'body': body,
+}
+started = time.perf_counter()
+response = index.handler(event, None)
+ping_ms = (time.perf_counter() - started) * 1000
+assert response['statusCode'] == 200, response
+
+result = {'importMs': import_ms, 'firstPingMs': ping_ms, 'modules': len(sys.modules)}
+
+if os.environ.get('DATABASE_URL'):
+    started = time.perf_counter()
+    response = index.handler({'httpMethod': 'GET', 'path': '/servers', 'headers': {}}, None)
+    result['firstDbRequestMs'] = (time.perf_counter() - started) * 1000
+
+print(json.dumps(result))
+'''
+
+
+def run_probe(signing_key: SigningKey) -> Dict[str, float]:
+    # Ключ создаётся здесь, в родителе, чтобы процесс-проба не импортировал nacl до замера
+    env = dict(os.environ, DISCORD_PUBLIC_KEY=signing_key.verify_key.encode().hex())
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, BOT_DIR, bytes(signing_key).hex()],
+        check=True, capture_output=True, text=True, env=env
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        'medianMs': round(statistics.median(ordered), 3),
+        'minMs': round(ordered[0], 3),
+        'maxMs': round(ordered[-1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure backend/bot cold-start import and first-request latency')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--baseline', help='previous JSON output to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    signing_key = SigningKey.generate()
+    samples = [run_probe(signing_key) for _ in range(args.runs)]
+    results = {
+        key: summarize([sample[key] for sample in samples])
+        for key in ('importMs', 'firstPingMs', 'firstDbRequestMs')
+        if key in samples[0]
+    }
+    report = {'meta': {'runs': args.runs, 'modules': samples[0]['modules']}, 'results': results}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = [
+            f"{key}: median {baseline[key]['medianMs']}ms -> {current['medianMs']}ms"
+            for key, current in results.items()
+            if key in baseline and current['medianMs'] > baseline[key]['medianMs'] * (1 + args.max_regression)
+        ]
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
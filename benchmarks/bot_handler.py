@@ -0,0 +1,319 @@
+'''
+Бенчмарк обработчика backend/bot: подписанные Discord-взаимодействия и REST-запросы
+дашборда прогоняются через handler() на локальном Postgres.
+
+Запуск:
+    DATABASE_URL=postgresql://localhost/bot_bench python benchmarks/bot_handler.py \
+        --apply-migrations --seed --scale small --output bench.json
+
+Результат — JSON с p50/p95/p99, RPS и числом SQL-запросов на запрос для каждого
+сценария. С --baseline прогон сравнивается с прошлым результатом и завершается
+с кодом 1, если p95 любого сценария вырос больше чем на --max-regression.
+'''
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from nacl.signing import SigningKey
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_DIR = os.path.join(ROOT, 'backend', 'bot')
+MIGRATIONS_DIR = os.path.join(ROOT, 'db_migrations')
+
+SCALES = {
+    'small': {'guilds': 100, 'candidates': 1_000, 'votes': 10_000},
+    'medium': {'guilds': 1_000, 'candidates': 10_000, 'votes': 100_000},
+    'large': {'guilds': 10_000, 'candidates': 100_000, 'votes': 1_000_000},
+}
+
+_query_counter = threading.local()
+_counting_cursor_classes: Dict[type, type] = {}
+
+
+def counting_cursor_class(base: type) -> type:
+    if base not in _counting_cursor_classes:
+        def execute(self, query, vars=None):
+            _query_counter.count = getattr(_query_counter, 'count', 0) + 1
+            return base.execute(self, query, vars)
+
+        _counting_cursor_classes[base] = type(f'Counting{base.__name__}', (base,), {'execute': execute})
+    return _counting_cursor_classes[base]
+
+
+def counting_connection_class(base: type) -> type:
+    def cursor(self, *args, **kwargs):
+        cursor_base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = counting_cursor_class(cursor_base)
+        return base.cursor(self, *args, **kwargs)
+
+    return type(f'Counting{base.__name__}', (base,), {'cursor': cursor})
+
+
+def apply_migrations(dsn: str):
+    conn = psycopg2.connect(dsn)
+    cursor = conn.cursor()
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, 'V*.sql'))):
+        with open(path, encoding='utf-8') as f:
+            cursor.execute(f.read())
+    conn.commit()
+    conn.close()
+
+
+def seed(dsn: str, guilds: int, candidates: int, votes: int):
+    '''
+    Половина серверов в регистрации, половина в голосовании. Кандидаты делятся поровну
+    между выборами, голоса — между выборами в фазе голосования.
+    '''
+    per_election = max(candidates // guilds, 1)
+    voting_guilds = max(guilds // 2, 1)
+
+    conn = psycopg2.connect(dsn)
+    cursor = conn.cursor()
+    cursor.execute(
+        "TRUNCATE servers, bot_admins, elections, candidates, votes, vote_tallies,"
+        " election_changes, processed_interactions CASCADE"
+    )
+    cursor.execute(
+        """
+        INSERT INTO servers (id, name, member_count)
+        SELECT 'g' || n, 'Guild ' || n, 1000 FROM generate_series(0, %(guilds)s - 1) AS n
+        """,
+        {'guilds': guilds}
+    )
+    cursor.execute(
+        """
+        INSERT INTO bot_admins (server_id, user_id, user_name)
+        SELECT 'g' || n, 'admin' || n, 'Admin ' || n FROM generate_series(0, %(guilds)s - 1) AS n
+        """,
+        {'guilds': guilds}
+    )
+    cursor.execute(
+        """
+        INSERT INTO elections (
+            id, server_id, title, description, status, assigned_roles,
+            duration, registration_duration, term_duration, server_member_count
+        )
+        SELECT 'e' || n, 'g' || n, 'Election ' || n, 'Benchmark election',
+               CASE WHEN n < %(voting)s THEN 'voting' ELSE 'registration' END,
+               ARRAY['@Moderator'], 24, 24, 168, 1000
+        FROM generate_series(0, %(guilds)s - 1) AS n
+        """,
+        {'guilds': guilds, 'voting': voting_guilds}
+    )
+    cursor.execute(
+        """
+        INSERT INTO candidates (id, election_id, user_id, user_name, speech)
+        SELECT 'e' || e || '_c' || c, 'e' || e, 'c' || c, 'Candidate ' || c, repeat('Speech ', 20)
+        FROM generate_series(0, %(guilds)s - 1) AS e, generate_series(0, %(per)s - 1) AS c
+        """,
+        {'guilds': guilds, 'per': per_election}
+    )
+    cursor.execute(
+        """
+        INSERT INTO votes (election_id, user_id, user_name, candidate_id)
+        SELECT 'e' || (n %% %(voting)s), 'v' || n, 'Voter ' || n,
+               'e' || (n %% %(voting)s) || '_c' || ((n / %(voting)s) %% %(per)s)
+        FROM generate_series(0, %(votes)s - 1) AS n
+        """,
+        {'voting': voting_guilds, 'per': per_election, 'votes': votes}
+    )
+    conn.commit()
+    cursor.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return {'guilds': guilds, 'votingGuilds': voting_guilds, 'candidatesPerElection': per_election, 'votes': votes}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def signed_event(signing_key: SigningKey, interaction: Dict[str, Any]) -> Dict[str, Any]:
+    body = json.dumps(interaction)
+    timestamp = str(int(time.time()))
+    signature = signing_key.sign((timestamp + body).encode()).signature.hex()
+    return {
+        'httpMethod': 'POST',
+        'path': '/',
+        'headers': {'X-Signature-Ed25519': signature, 'X-Signature-Timestamp': timestamp},
+        'body': body,
+    }
+
+
+def interaction(guild: int, user: str, subcommand: str, options: List[Dict] = None, seq: int = 0) -> Dict[str, Any]:
+    return {
+        'id': f'bench-{subcommand}-{seq}-{time.time_ns()}',
+        'type': 2,
+        'application_id': 'bench-app',
+        'token': f'bench-token-{seq}',
+        'guild_id': f'g{guild}',
+        'guild': {'name': f'Guild {guild}'},
+        'member': {'user': {'id': user, 'username': user}, 'roles': []},
+        'data': {'name': 'vote', 'options': [{'name': subcommand, 'type': 1, 'options': options or []}]},
+    }
+
+
+def build_scenarios(signing_key: SigningKey, layout: Dict[str, int]) -> Dict[str, Callable[[int], Dict[str, Any]]]:
+    guilds = layout['guilds']
+    voting = layout['votingGuilds']
+    registering = max(guilds - voting, 1)
+    per = layout['candidatesPerElection']
+
+    def voting_guild(i: int) -> int:
+        return i % voting
+
+    def registration_guild(i: int) -> int:
+        return voting + i % registering
+
+    return {
+        'discord:vote:info': lambda i: signed_event(signing_key, interaction(voting_guild(i), f'u{i}', 'info', seq=i)),
+        'discord:vote:list': lambda i: signed_event(signing_key, interaction(voting_guild(i), f'u{i}', 'list', seq=i)),
+        'discord:vote:register': lambda i: signed_event(signing_key, interaction(
+            registration_guild(i), f'bench-r{i}', 'register', [{'name': 'speech', 'type': 3, 'value': 'Benchmark speech'}], seq=i
+        )),
+        'discord:vote:withdraw': lambda i: signed_event(signing_key, interaction(
+            registration_guild(i), f'bench-r{i}', 'withdraw', seq=i
+        )),
+        'discord:vote:cast': lambda i: signed_event(signing_key, interaction(
+            voting_guild(i), f'bench-v{i}', 'cast', [{'name': 'candidate', 'type': 6, 'value': f'c{i % per}'}], seq=i
+        )),
+        'api:GET /servers': lambda i: {'httpMethod': 'GET', 'path': '/servers', 'headers': {}, 'queryStringParameters': {}},
+        'api:GET /elections': lambda i: {
+            'httpMethod': 'GET', 'path': '/elections', 'headers': {},
+            'queryStringParameters': {'server_id': f'g{voting_guild(i)}'}
+        },
+        'api:POST /votes/cast': lambda i: {
+            'httpMethod': 'POST', 'path': '/votes/cast', 'headers': {},
+            'body': json.dumps({
+                'electionId': f'e{voting_guild(i)}', 'userId': f'bench-a{i}', 'userName': f'bench-a{i}',
+                'candidateId': f'e{voting_guild(i)}_c{i % per}'
+            })
+        },
+    }
+
+
+def run_scenario(handler: Callable, make_event: Callable[[int], Dict], requests: int, concurrency: int) -> Dict[str, Any]:
+    events = [make_event(i) for i in range(requests)]
+
+    def call(event: Dict[str, Any]) -> Tuple[float, int, int]:
+        _query_counter.count = 0
+        started = time.perf_counter()
+        response = handler(event, None)
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, _query_counter.count, response['statusCode']
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(call, events))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(s[0] for s in samples)
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'p50Ms': round(percentile(latencies, 50), 3),
+        'p95Ms': round(percentile(latencies, 95), 3),
+        'p99Ms': round(percentile(latencies, 99), 3),
+        'rps': round(requests / wall, 1) if wall else 0.0,
+        'queriesPerRequest': round(sum(s[1] for s in samples) / len(samples), 2),
+        'errors': sum(1 for s in samples if s[2] >= 500),
+    }
+
+
+def compare_with_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], max_regression: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get('p95Ms'):
+            continue
+        growth = current['p95Ms'] / previous['p95Ms'] - 1
+        if growth > max_regression:
+            regressions.append(f"{name}: p95 {previous['p95Ms']}ms -> {current['p95Ms']}ms (+{growth:.0%})")
+        if current['queriesPerRequest'] > previous['queriesPerRequest']:
+            regressions.append(f"{name}: queries/request {previous['queriesPerRequest']} -> {current['queriesPerRequest']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark backend/bot handler against a local Postgres')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL', ''))
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--guilds', type=int)
+    parser.add_argument('--candidates', type=int)
+    parser.add_argument('--votes', type=int)
+    parser.add_argument('--apply-migrations', action='store_true')
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--scenario', action='append', help='run only these scenarios (repeatable)')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--baseline', help='previous JSON output to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error('DATABASE_URL or --dsn is required')
+
+    sizes = dict(SCALES[args.scale])
+    for key in ('guilds', 'candidates', 'votes'):
+        if getattr(args, key):
+            sizes[key] = getattr(args, key)
+
+    if args.apply_migrations:
+        apply_migrations(args.dsn)
+
+    layout = seed(args.dsn, **sizes) if args.seed else {
+        'guilds': sizes['guilds'],
+        'votingGuilds': max(sizes['guilds'] // 2, 1),
+        'candidatesPerElection': max(sizes['candidates'] // sizes['guilds'], 1),
+        'votes': sizes['votes'],
+    }
+
+    signing_key = SigningKey.generate()
+    os.environ['DATABASE_URL'] = args.dsn
+    os.environ['DISCORD_PUBLIC_KEY'] = signing_key.verify_key.encode().hex()
+    os.environ.setdefault('DISCORD_DEFER_MODE', 'off')
+    sys.path.insert(0, BOT_DIR)
+    import index
+
+    index.open_db_pool(
+        max(args.concurrency + 1, index.DB_POOL_MAX), connection_factory=counting_connection_class(index.TracedConnection)
+    )
+
+    scenarios = build_scenarios(signing_key, layout)
+    selected = args.scenario or list(scenarios)
+    results = {
+        name: run_scenario(index.handler, scenarios[name], args.requests, args.concurrency)
+        for name in selected
+    }
+
+    report = {'meta': {'scale': args.scale, 'data': layout, 'python': sys.version.split()[0]}, 'results': results}
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f)['results'], args.max_regression)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
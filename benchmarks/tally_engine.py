@@ -0,0 +1,126 @@
+'''
+Бенчмарк движка подсчёта backend/bot/tally.py: векторная реализация на NumPy против
+эталонной на чистом Python на одних и тех же случайных ранжированных бюллетенях.
+
+Запуск:
+    python benchmarks/tally_engine.py --ballots 500000 --candidates 20 --seats 3 --output tally.json
+
+Для каждого метода (fptp, irv, stv) замеряется медиана времени пересчёта готовой матрицы
+(vectorizedMs) и всего пути подведения итогов (completionMs): разбор сгруппированных
+бюллетеней в том виде, в каком их отдаёт RANKED_BALLOTS_SQL, плюс пересчёт. Проверяется,
+что обе реализации выбрали одних и тех же победителей. С --baseline рост любой из
+медиан больше чем на --max-regression завершает процесс с кодом 1.
+'''
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'bot'))
+
+import tally  # noqa: E402
+
+
+def generate_ballots(ballots: int, candidates: int, depth: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    popularity = rng.gamma(2.0, 1.0, candidates)
+    scores = rng.gumbel(size=(ballots, candidates)) + np.log(popularity)
+    matrix = np.argsort(-scores, axis=1)[:, :depth].astype(np.int16)
+    lengths = rng.integers(1, depth + 1, ballots)
+    matrix[np.arange(depth) >= lengths[:, None]] = -1
+    return matrix
+
+
+def database_ballots(matrix: np.ndarray) -> Tuple[str, str, int]:
+    '''Одинаковые бюллетени сгруппированы и склеены через запятую, как в ответе RANKED_BALLOTS_SQL.'''
+    grouped, weights = np.unique(matrix, axis=0, return_counts=True)
+    return ','.join(map(str, grouped.ravel().tolist())), ','.join(map(str, weights.tolist())), grouped.shape[1]
+
+
+def measure(fn: Callable[[], List[int]], runs: int) -> Dict:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        winners = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {'medianMs': round(statistics.median(timings), 3), 'minMs': round(min(timings), 3), 'winners': winners}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vectorized tally engine against the pure-Python reference')
+    parser.add_argument('--ballots', type=int, default=500_000)
+    parser.add_argument('--candidates', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=5, help='maximum ranking length')
+    parser.add_argument('--seats', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--reference-runs', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--baseline', help='previous JSON output to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    matrix = generate_ballots(args.ballots, args.candidates, args.depth, args.seed)
+    values, weights, width = database_ballots(matrix)
+    remap = {i: i for i in range(args.candidates)}
+
+    def complete(method: str, vectorized: bool) -> List[int]:
+        rows, row_weights = tally.parse_ballots(values, weights, width, remap, vectorized=vectorized)
+        return tally.elect(method, rows, args.candidates, args.seats, row_weights, vectorized=vectorized)
+
+    results = {}
+    for method in tally.METHODS:
+        vectorized = measure(
+            lambda: tally.elect(method, matrix, args.candidates, args.seats, vectorized=True), args.runs
+        )
+        completion = measure(lambda: complete(method, True), args.runs)
+        reference = measure(lambda: complete(method, False), args.reference_runs)
+        results[method] = {
+            'vectorizedMs': vectorized['medianMs'],
+            'completionMs': completion['medianMs'],
+            'referenceMs': reference['medianMs'],
+            'speedup': round(reference['medianMs'] / max(completion['medianMs'], 1e-6), 1),
+            'winners': completion['winners'],
+            'winnersMatch': vectorized['winners'] == completion['winners'] == reference['winners'],
+        }
+
+    report = {
+        'meta': {
+            'ballots': args.ballots, 'candidates': args.candidates, 'depth': args.depth,
+            'seats': args.seats, 'runs': args.runs, 'distinctBallots': len(weights.split(',')),
+            'numpy': np.__version__,
+        },
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    failures = [f'{method}: winners differ from reference' for method, r in results.items() if not r['winnersMatch']]
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        failures += [
+            f"{method}: {key} {baseline[method][key]}ms -> {current[key]}ms"
+            for method, current in results.items()
+            for key in ('vectorizedMs', 'completionMs')
+            if key in baseline.get(method, {}) and current[key] > baseline[method][key] * (1 + args.max_regression)
+        ]
+    for line in failures:
+        print(f'REGRESSION {line}', file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+-- Составной индекс для поиска активных выборов сервера (server_id, status, created_at DESC)
+CREATE INDEX IF NOT EXISTS idx_elections_server_status_created ON elections(server_id, status, created_at DESC);
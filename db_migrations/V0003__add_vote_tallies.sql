@@ -0,0 +1,13 @@
+-- Итоги голосования без горячих счётчиков: голоса только вставляются в votes,
+-- а vote_tallies периодически накапливает уже учтённые (tallied) голоса
+
+ALTER TABLE votes ADD COLUMN IF NOT EXISTS tallied BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE TABLE IF NOT EXISTS vote_tallies (
+    election_id TEXT NOT NULL REFERENCES elections(id),
+    candidate_id TEXT NOT NULL REFERENCES candidates(id) ON DELETE CASCADE,
+    votes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (election_id, candidate_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_votes_untallied ON votes(election_id, candidate_id) WHERE NOT tallied;
@@ -0,0 +1,2 @@
+-- Индекс для дешёвого MAX(id) голосов по выборам (версия для ETag дашборда)
+CREATE INDEX IF NOT EXISTS idx_votes_election_id_id ON votes(election_id, id);
@@ -0,0 +1,13 @@
+-- Журнал изменений выборов для инкрементальной ленты дашборда.
+-- txid — идентификатор записавшей транзакции: лента отдаёт только строки завершённых транзакций.
+CREATE TABLE IF NOT EXISTS election_changes (
+    seq BIGSERIAL PRIMARY KEY,
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    server_id TEXT NOT NULL,
+    election_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_election_changes_server_txid ON election_changes(server_id, txid, seq);
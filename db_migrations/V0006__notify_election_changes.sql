@@ -0,0 +1,16 @@
+-- Уведомления об изменениях выборов для SSE-трансляции (backend/bot/stream.py).
+-- Канал на сервер; одинаковые уведомления внутри одной транзакции Postgres склеивает сам.
+CREATE OR REPLACE FUNCTION notify_election_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'election_changes_' || NEW.server_id,
+        json_build_object('electionId', NEW.election_id, 'kind', NEW.kind)::text
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS election_changes_notify ON election_changes;
+CREATE TRIGGER election_changes_notify
+    AFTER INSERT ON election_changes
+    FOR EACH ROW EXECUTE FUNCTION notify_election_change();
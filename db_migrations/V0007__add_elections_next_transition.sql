@@ -0,0 +1,15 @@
+-- Момент следующего автоматического перехода фазы выборов для планировщика (POST /scheduler/tick).
+-- Вычисляемая колонка: поддерживается самой базой при любом изменении статуса и дат.
+ALTER TABLE elections ADD COLUMN IF NOT EXISTS next_transition_at TIMESTAMP GENERATED ALWAYS AS (
+    CASE
+        WHEN status = 'registration' THEN registration_end_date
+        WHEN status = 'voting' THEN voting_end_date
+        WHEN status = 'completed' AND auto_start THEN term_end_date - make_interval(days => days_before_term_end)
+    END
+) STORED;
+
+-- Аренда выборов воркером планировщика, чтобы переход не применялся дважды
+ALTER TABLE elections ADD COLUMN IF NOT EXISTS transition_lease_until TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_elections_next_transition ON elections(next_transition_at)
+    WHERE next_transition_at IS NOT NULL;
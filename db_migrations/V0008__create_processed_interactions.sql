@@ -0,0 +1,9 @@
+-- Обработанные Discord-взаимодействия: общая для всех экземпляров функции защита от повторной доставки.
+-- Используется при DISCORD_DEDUP_STORE=postgres; строки старше окна свежести удаляются самой функцией.
+CREATE TABLE IF NOT EXISTS processed_interactions (
+    id TEXT PRIMARY KEY,
+    response JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_processed_interactions_created_at ON processed_interactions(created_at);
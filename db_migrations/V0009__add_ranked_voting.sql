@@ -0,0 +1,11 @@
+-- Многоместные и ранжированные выборы: способ подсчёта, число мест и все победители.
+ALTER TABLE elections ADD COLUMN IF NOT EXISTS voting_method TEXT NOT NULL DEFAULT 'fptp'
+    CHECK (voting_method IN ('fptp', 'irv', 'stv'));
+ALTER TABLE elections ADD COLUMN IF NOT EXISTS seats INTEGER NOT NULL DEFAULT 1 CHECK (seats >= 1);
+ALTER TABLE elections ADD COLUMN IF NOT EXISTS winner_user_ids TEXT[] NOT NULL DEFAULT '{}';
+
+-- Порядковый номер кандидата в бюллетене, назначается при старте голосования
+ALTER TABLE candidates ADD COLUMN IF NOT EXISTS ballot_index SMALLINT;
+
+-- Ранжированный бюллетень: ballot_index кандидатов по убыванию предпочтения; NULL — только candidate_id
+ALTER TABLE votes ADD COLUMN IF NOT EXISTS ranking SMALLINT[];
@@ -0,0 +1,2 @@
+-- Очистка ленты изменений по сроку хранения (планировщик удаляет записи старше ELECTION_CHANGES_RETENTION_HOURS).
+CREATE INDEX IF NOT EXISTS idx_election_changes_created_at ON election_changes(created_at);
@@ -0,0 +1,6 @@
+-- NOTIFY берёт общий на базу лок при коммите и сериализует все уведомляющие транзакции.
+-- Голоса больше не уведомляют: stream.py забирает их из election_changes опросом.
+DROP TRIGGER IF EXISTS election_changes_notify ON election_changes;
+CREATE TRIGGER election_changes_notify
+    AFTER INSERT ON election_changes
+    FOR EACH ROW WHEN (NEW.kind <> 'vote') EXECUTE FUNCTION notify_election_change();
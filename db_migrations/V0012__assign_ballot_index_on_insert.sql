@@ -0,0 +1,12 @@
+-- Кандидат, добавленный во время голосования, теперь получает номер в бюллетене при вставке.
+-- Уже добавленным без номера он назначается здесь, после номеров остальных кандидатов.
+UPDATE candidates c SET ballot_index = n.ballot_index
+FROM (
+    SELECT c.id,
+           COALESCE(MAX(c.ballot_index) OVER (PARTITION BY c.election_id), -1)
+           + row_number() OVER (PARTITION BY c.election_id, c.ballot_index IS NULL ORDER BY c.registered_at, c.id) AS ballot_index,
+           c.ballot_index IS NULL AS missing
+    FROM candidates c JOIN elections e ON e.id = c.election_id
+    WHERE e.status = 'voting'
+) n
+WHERE c.id = n.id AND n.missing;
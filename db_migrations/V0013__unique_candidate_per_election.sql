@@ -0,0 +1,12 @@
+-- Один пользователь — один кандидат в выборах: параллельные добавления больше не создают дубликатов.
+-- Уже существующие дубликаты, за которые ещё никто не голосовал, удаляются; остаётся самая ранняя запись.
+DELETE FROM candidates c
+USING candidates k
+WHERE k.election_id = c.election_id AND k.user_id = c.user_id
+  AND (k.registered_at, k.id) < (c.registered_at, c.id)
+  AND NOT EXISTS (
+      SELECT 1 FROM votes v
+      WHERE v.election_id = c.election_id AND (v.candidate_id = c.id OR c.ballot_index = ANY(v.ranking))
+  );
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_candidates_election_user ON candidates(election_id, user_id);
@@ -7,13 +7,40 @@ export const api = {
     return response.json();
   },
 
-  async getElections(serverId?: string) {
-    const url = serverId ? `${API_URL}/elections?server_id=${serverId}` : `${API_URL}/elections`;
+  async getElections(serverId?: string, options: { status?: string; limit?: number; before?: string } = {}) {
+    const params = new URLSearchParams();
+    if (serverId) params.set('server_id', serverId);
+    if (options.status) params.set('status', options.status);
+    if (options.limit) params.set('limit', String(options.limit));
+    if (options.before) params.set('before', options.before);
+    const qs = params.toString();
+    const url = qs ? `${API_URL}/elections?${qs}` : `${API_URL}/elections`;
     const response = await fetch(url);
     if (!response.ok) throw new Error('Failed to fetch elections');
     return response.json();
   },
 
+  async getChanges(serverId: string, cursor?: string) {
+    const params = new URLSearchParams({ server_id: serverId });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`${API_URL}/elections/changes?${params.toString()}`);
+    if (!response.ok) throw new Error('Failed to fetch election changes');
+    return response.json();
+  },
+
+  async getVoters(electionId: string, options: { limit?: number; after?: string } = {}) {
+    const params = new URLSearchParams({ election_id: electionId });
+    if (options.limit) params.set('limit', String(options.limit));
+    if (options.after) params.set('after', options.after);
+    const response = await fetch(`${API_URL}/elections/voters?${params.toString()}`);
+    if (!response.ok) throw new Error('Failed to fetch voters');
+    return response.json();
+  },
+
+  getVotersExportUrl(electionId: string, format: 'ndjson' | 'csv' = 'csv') {
+    return `${API_URL}/elections/voters/export?${new URLSearchParams({ election_id: electionId, format }).toString()}`;
+  },
+
   async createElection(data: any) {
     const response = await fetch(`${API_URL}/elections/create`, {
       method: 'POST',
@@ -24,6 +51,16 @@ export const api = {
     return response.json();
   },
 
+  async bulkCreateElections(elections: any[]) {
+    const response = await fetch(`${API_URL}/elections/bulk-create`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ elections })
+    });
+    if (!response.ok) throw new Error('Failed to import elections');
+    return response.json();
+  },
+
   async updateElection(data: any) {
     const response = await fetch(`${API_URL}/elections/update`, {
       method: 'PUT',
@@ -64,6 +101,16 @@ export const api = {
     return response.json();
   },
 
+  async completeElections(electionIds: string[]) {
+    const response = await fetch(`${API_URL}/elections/complete`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ election_ids: electionIds })
+    });
+    if (!response.ok) throw new Error('Failed to complete elections');
+    return response.json();
+  },
+
   async addCandidate(data: any) {
     const response = await fetch(`${API_URL}/candidates/add`, {
       method: 'POST',
@@ -74,6 +121,16 @@ export const api = {
     return response.json();
   },
 
+  async bulkAddCandidates(candidates: any[]) {
+    const response = await fetch(`${API_URL}/candidates/bulk-add`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ candidates })
+    });
+    if (!response.ok) throw new Error('Failed to import candidates');
+    return response.json();
+  },
+
   async removeCandidate(candidateId: string) {
     const response = await fetch(`${API_URL}/candidates/remove`, {
       method: 'POST',
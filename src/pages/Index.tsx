@@ -299,7 +299,21 @@ const Index = () => {
     }));
   };
 
+  const isRoleId = (role: string) => /^(\d+|<@&\d+>)$/.test(role);
+
+  const rejectRoleName = (role: string) => {
+    toast({
+      title: "Нужен ID роли",
+      description: `«${role}» — не ID. Укажите ID роли (ПКМ по роли → «Копировать ID роли») или упоминание <@&ID>`,
+      variant: "destructive"
+    });
+  };
+
   const addCandidateRole = () => {
+    if (candidateRoleInput.trim() && !isRoleId(candidateRoleInput.trim())) {
+      rejectRoleName(candidateRoleInput.trim());
+      return;
+    }
     if (candidateRoleInput.trim() && !newElection.candidateRoles.includes(candidateRoleInput.trim())) {
       setNewElection(prev => ({
         ...prev,
@@ -317,6 +331,10 @@ const Index = () => {
   };
 
   const addVoterRole = () => {
+    if (voterRoleInput.trim() && !isRoleId(voterRoleInput.trim())) {
+      rejectRoleName(voterRoleInput.trim());
+      return;
+    }
     if (voterRoleInput.trim() && !newElection.voterRoles.includes(voterRoleInput.trim())) {
       setNewElection(prev => ({
         ...prev,
@@ -884,7 +902,7 @@ const Index = () => {
                     <Label>Кто может выдвигать свою кандидатуру</Label>
                     <div className="flex gap-2">
                       <Input
-                        placeholder="@Проверенный"
+                        placeholder="ID роли, например 123456789012345678"
                         value={candidateRoleInput}
                         onChange={(e) => setCandidateRoleInput(e.target.value)}
                         onKeyDown={(e) => e.key === 'Enter' && (e.preventDefault(), addCandidateRole())}
@@ -917,7 +935,7 @@ const Index = () => {
                     <Label>Кто может голосовать</Label>
                     <div className="flex gap-2">
                       <Input
-                        placeholder="@Участник"
+                        placeholder="ID роли, например 123456789012345678"
                         value={voterRoleInput}
                         onChange={(e) => setVoterRoleInput(e.target.value)}
                         onKeyDown={(e) => e.key === 'Enter' && (e.preventDefault(), addVoterRole())}
@@ -0,0 +1,93 @@
+'''
+Интеграционные тесты backend/bot идут против настоящего Postgres с применёнными
+миграциями db_migrations. Без DATABASE_URL тесты, которым нужна база, пропускаются.
+
+Запуск:
+    DATABASE_URL=postgresql://localhost/bot_test python -m pytest -q tests
+'''
+import os
+import secrets
+import sys
+
+import psycopg2
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'bot'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import index  # noqa: E402
+
+ELECTION = {
+    'title': 'Выборы', 'assignedRoles': ['Модератор'], 'duration': 24,
+    'registrationDuration': 24, 'termDuration': 720, 'serverMemberCount': 100
+}
+
+
+@pytest.fixture
+def dsn():
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        pytest.skip('DATABASE_URL is not set')
+    return dsn
+
+
+@pytest.fixture
+def conn(dsn):
+    conn = psycopg2.connect(dsn)
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+def delete_servers(conn, server_ids):
+    cursor = conn.cursor()
+    elections = "SELECT id FROM elections WHERE server_id = ANY(%(ids)s)"
+    cursor.execute(f"DELETE FROM vote_tallies WHERE election_id IN ({elections})", {'ids': server_ids})
+    cursor.execute(f"DELETE FROM votes WHERE election_id IN ({elections})", {'ids': server_ids})
+    cursor.execute(f"DELETE FROM candidates WHERE election_id IN ({elections})", {'ids': server_ids})
+    cursor.execute("DELETE FROM election_changes WHERE server_id = ANY(%(ids)s)", {'ids': server_ids})
+    cursor.execute("DELETE FROM elections WHERE server_id = ANY(%(ids)s)", {'ids': server_ids})
+    cursor.execute("DELETE FROM bot_admins WHERE server_id = ANY(%(ids)s)", {'ids': server_ids})
+    cursor.execute("DELETE FROM servers WHERE id = ANY(%(ids)s)", {'ids': server_ids})
+    conn.commit()
+    cursor.close()
+
+
+@pytest.fixture
+def server_id(conn):
+    '''Отдельный сервер на тест; всё, что тест на нём создал, удаляется после.'''
+    server_id = f'test_{secrets.token_hex(6)}'
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO servers (id, name, member_count) VALUES (%s, %s, 100)", (server_id, server_id))
+    conn.commit()
+    cursor.close()
+    yield server_id
+    conn.rollback()
+    delete_servers(conn, [server_id])
+
+
+def add_candidate(conn, election_id: str, user_id: str) -> str:
+    index.api_add_candidate(conn, {'electionId': election_id, 'userId': user_id, 'userName': user_id, 'speech': '...'})
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM candidates WHERE election_id = %s AND user_id = %s", (election_id, user_id))
+    candidate_id = cursor.fetchone()[0]
+    cursor.close()
+    return candidate_id
+
+
+@pytest.fixture
+def make_election(conn, server_id):
+    '''
+    Выборы на тестовом сервере, доведённые до status ('registration' или 'voting').
+    Кандидаты регистрируются до голосования; возвращает id выборов и {user_id: id кандидата}.
+    '''
+    def make(status: str = 'voting', candidates=('A', 'B'), **fields) -> tuple:
+        election_id = index.api_create_election(conn, dict(ELECTION, serverId=server_id, **fields))['electionId']
+        index.api_start_registration(conn, election_id)
+        candidate_ids = {user_id: add_candidate(conn, election_id, user_id) for user_id in candidates}
+        if status == 'voting':
+            index.api_start_voting(conn, election_id)
+        return election_id, candidate_ids
+
+    return make
@@ -0,0 +1,29 @@
+import json
+
+import index
+
+
+def autocomplete(server_id: str, prefix: str) -> list:
+    response = index.handle_discord_autocomplete({
+        'type': 4,
+        'guild_id': server_id,
+        'data': {'name': 'vote', 'options': [{
+            'name': 'cast', 'type': 1, 'options': [{'name': 'candidate', 'type': 3, 'value': prefix, 'focused': True}]
+        }]}
+    })
+    return json.loads(response['body'])['data']['choices']
+
+
+def test_prefix_hit_is_served_from_cache_without_the_database(conn, server_id, make_election, monkeypatch):
+    election_id, _ = make_election(candidates=['Анна', 'Андрей', 'Борис'])
+    index.find_active_election(conn, server_id, ('voting',))
+    index.get_candidate_index(conn, election_id)
+
+    def no_database():
+        raise AssertionError('autocomplete hit the database')
+
+    monkeypatch.setattr(index, 'db_connection', no_database)
+    assert autocomplete(server_id, ' АН') == [
+        {'name': 'Андрей', 'value': 'Андрей'}, {'name': 'Анна', 'value': 'Анна'}
+    ]
+    assert autocomplete(server_id, 'бор') == [{'name': 'Борис', 'value': 'Борис'}]
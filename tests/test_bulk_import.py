@@ -0,0 +1,60 @@
+import threading
+
+import psycopg2
+
+import index
+from conftest import ELECTION
+
+
+def test_invalid_items_are_reported_without_failing_the_batch(conn, server_id):
+    result = index.api_bulk_create_elections(conn, {'elections': [
+        42,
+        dict(ELECTION, serverId=server_id, assignedRoles=[{'name': 'Модератор'}]),
+        dict(ELECTION, serverId=server_id, duration=10 ** 12),
+        dict(ELECTION, serverId=server_id),
+    ]})
+    assert [e['index'] for e in result['errors']] == [0, 1, 2]
+    assert [c['index'] for c in result['created']] == [3]
+
+    election_id = result['created'][0]['electionId']
+    result = index.api_bulk_add_candidates(conn, {'candidates': [
+        {'electionId': election_id, 'userId': 7, 'userName': 'A', 'speech': '...'},
+        {'electionId': election_id, 'userId': 'A', 'userName': 'A', 'speech': '...'},
+    ]})
+    assert [e['index'] for e in result['errors']] == [0]
+    assert [c['index'] for c in result['created']] == [1]
+
+    result = index.api_complete_election(conn, election_ids=[42, {'id': election_id}, 'election_missing'])
+    assert [e['index'] for e in result['errors']] == [0, 1]
+    assert result['results'] == {'election_missing': {'error': 'Election not found'}}
+
+
+def test_concurrent_bulk_adds_register_a_candidate_once(dsn, conn, make_election):
+    election_id, _ = make_election(status='registration', candidates=())
+    barrier = threading.Barrier(4)
+    results = []
+
+    def add():
+        own = psycopg2.connect(dsn)
+        try:
+            barrier.wait()
+            results.append(index.api_bulk_add_candidates(own, {'candidates': [
+                {'electionId': election_id, 'userId': 'A', 'userName': 'A', 'speech': '...'}
+            ]}))
+        finally:
+            own.close()
+
+    threads = [threading.Thread(target=add) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(len(r['created']) for r in results) == 1
+    assert index.api_add_candidate(conn, {'electionId': election_id, 'userId': 'A', 'userName': 'A', 'speech': '...'}) == {
+        'error': 'Election not found or candidate already registered'
+    }
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM candidates WHERE election_id = %s AND user_id = 'A'", (election_id,))
+    assert cursor.fetchone()[0] == 1
+    cursor.close()
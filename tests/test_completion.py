@@ -0,0 +1,23 @@
+import index
+
+
+def test_one_call_completes_several_elections_each_on_its_own_branch(conn, make_election):
+    won, won_candidates = make_election(serverMemberCount=10)
+    failed, failed_candidates = make_election(serverMemberCount=10, retryOnFail=False)
+    registering, _ = make_election(status='registration')
+    for voter in range(3):
+        index.api_cast_vote(conn, {'electionId': won, 'userId': f'v{voter}', 'userName': 'V', 'candidateId': won_candidates['B']})
+    index.api_cast_vote(conn, {'electionId': failed, 'userId': 'v0', 'userName': 'V', 'candidateId': failed_candidates['A']})
+
+    result = index.api_complete_election(conn, election_ids=[won, failed, registering, 'election_missing'])
+
+    assert result['results'] == {
+        won: {'success': True, 'status': 'completed', 'winner': 'B', 'winners': ['B']},
+        failed: {'success': True, 'status': 'failed'},
+        registering: {'error': 'Election is not in voting phase'},
+        'election_missing': {'error': 'Election not found'},
+    }
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, status FROM elections WHERE id = ANY(%s)", ([won, failed, registering],))
+    assert dict(cursor.fetchall()) == {won: 'completed', failed: 'failed', registering: 'registration'}
+    cursor.close()
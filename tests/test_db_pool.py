@@ -0,0 +1,58 @@
+import threading
+import time
+
+import psycopg2
+import pytest
+from psycopg2.pool import PoolError
+
+import index
+
+
+@pytest.fixture
+def pool(dsn, monkeypatch):
+    '''Пул из одного соединения вместо общего пула процесса.'''
+    pool = index.BoundedConnectionPool(1, 1, dsn, connection_factory=index.TracedConnection)
+    monkeypatch.setattr(index, '_db_pool', pool)
+    monkeypatch.setattr(index, '_db_conn_failed_at', 0.0)
+    yield pool
+    pool.closeall()
+
+
+def test_checkout_waits_for_a_released_connection(pool):
+    held = index.get_db_connection()
+    threading.Timer(0.2, index.release_db_connection, (held,)).start()
+
+    started = time.monotonic()
+    conn = index.get_db_connection()
+    assert time.monotonic() - started >= 0.15
+    index.release_db_connection(conn)
+
+
+def test_checkout_gives_up_after_the_acquire_timeout(pool, monkeypatch):
+    monkeypatch.setattr(index, 'DB_POOL_ACQUIRE_TIMEOUT', 0.1)
+    held = index.get_db_connection()
+    try:
+        with pytest.raises(PoolError):
+            index.get_db_connection()
+        response = index.handle_api_request({'httpMethod': 'GET', 'path': '/servers'})
+        assert response['statusCode'] == 503
+    finally:
+        index.release_db_connection(held)
+
+
+def test_request_retries_once_on_a_connection_closed_by_the_server(pool, dsn):
+    with index.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_backend_pid()")
+        pid = cursor.fetchone()[0]
+        cursor.close()
+
+    # Соединение простаивает меньше DB_POOL_PING_AFTER и выдаётся без проверки
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    admin.cursor().execute("SELECT pg_terminate_backend(%s)", (pid,))
+    admin.close()
+
+    response = index.handle_api_request({'httpMethod': 'GET', 'path': '/servers', 'queryStringParameters': {'limit': '1'}})
+    assert response['statusCode'] == 200
+    assert index._db_conn_failed_at > 0
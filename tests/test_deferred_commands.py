@@ -0,0 +1,72 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import index
+
+
+class DiscordStub(BaseHTTPRequestHandler):
+    '''Заглушка Discord API: запоминает вызовы webhook и отвечает 200/204.'''
+
+    def handle_webhook(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.server.calls.append((self.command, self.path, body))
+        self.send_response(204 if self.command == 'DELETE' else 200)
+        self.send_header('Content-Length', '2' if self.command != 'DELETE' else '0')
+        self.end_headers()
+        if self.command != 'DELETE':
+            self.wfile.write(b'{}')
+
+    do_POST = do_PATCH = do_DELETE = handle_webhook
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def discord_stub(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DiscordStub)
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(index, 'DISCORD_API_BASE', f'http://127.0.0.1:{server.server_port}')
+    yield server.calls
+    server.shutdown()
+    server.server_close()
+
+
+def interaction(server_id: str, subcommand: str, options: list = None) -> dict:
+    return {
+        'type': 2,
+        'application_id': 'app',
+        'token': 'tok',
+        'guild_id': server_id,
+        'guild': {'name': 'Test guild'},
+        'member': {'user': {'id': 'user1', 'username': 'Voter'}, 'roles': []},
+        'data': {'name': 'vote', 'options': [{'name': subcommand, 'type': 1, 'options': options or []}]}
+    }
+
+
+def test_public_result_edits_the_original_response(server_id, make_election, discord_stub):
+    make_election(status='registration', candidates=())
+
+    index.complete_deferred_command(interaction(server_id, 'register', [{'name': 'speech', 'type': 3, 'value': 'Голосуйте'}]))
+
+    assert len(discord_stub) == 1
+    method, path, body = discord_stub[0]
+    assert (method, path) == ('PATCH', '/webhooks/app/tok/messages/@original')
+    assert body['content'].startswith('✅')
+    assert 'flags' not in body
+
+
+def test_ephemeral_result_stays_ephemeral_after_defer(server_id, discord_stub):
+    index.complete_deferred_command(interaction(server_id, 'info'))
+
+    assert [(m, p) for m, p, _ in discord_stub] == [
+        ('POST', '/webhooks/app/tok'),
+        ('DELETE', '/webhooks/app/tok/messages/@original'),
+    ]
+    assert discord_stub[0][2]['flags'] == 64
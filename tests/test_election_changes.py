@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+import index
+
+
+def test_prune_removes_only_changes_past_retention(conn, server_id):
+    now = datetime.now()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO election_changes (server_id, election_id, kind, created_at) VALUES
+            (%(server_id)s, 'old', 'vote', %(old)s),
+            (%(server_id)s, 'fresh', 'vote', %(fresh)s)
+        """,
+        {
+            'server_id': server_id,
+            'old': now - timedelta(hours=index.ELECTION_CHANGES_RETENTION_HOURS + 1),
+            'fresh': now - timedelta(hours=1),
+        }
+    )
+    conn.commit()
+
+    assert index.prune_election_changes(conn, now) >= 1
+
+    cursor.execute("SELECT election_id FROM election_changes WHERE server_id = %s", (server_id,))
+    assert [row[0] for row in cursor.fetchall()] == ['fresh']
+    cursor.close()
@@ -0,0 +1,25 @@
+import index
+
+
+def get_elections(server_id: str, etag: str = None) -> dict:
+    return index.handle_api_request({
+        'httpMethod': 'GET', 'path': '/elections', 'queryStringParameters': {'server_id': server_id},
+        'headers': {'If-None-Match': etag} if etag else {}
+    })
+
+
+def test_matching_etag_is_not_modified_until_a_vote(dsn, conn, server_id, make_election, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', dsn)
+    election_id, candidates = make_election()
+
+    first = get_elections(server_id)
+    etag = first['headers']['ETag']
+    assert first['statusCode'] == 200
+
+    repeat = get_elections(server_id, etag)
+    assert (repeat['statusCode'], repeat['body'], repeat['headers']['ETag']) == (304, '', etag)
+
+    index.api_cast_vote(conn, {'electionId': election_id, 'userId': 'voter1', 'userName': 'Voter', 'candidateId': candidates['A']})
+    after_vote = get_elections(server_id, etag)
+    assert after_vote['statusCode'] == 200
+    assert after_vote['headers']['ETag'] != etag
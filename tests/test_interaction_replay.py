@@ -0,0 +1,44 @@
+import json
+import secrets
+from collections import OrderedDict
+
+import pytest
+
+import index
+
+
+def cast_interaction(server_id: str) -> dict:
+    return {
+        'id': f'test_{secrets.token_hex(8)}',
+        'type': 2,
+        'guild_id': server_id,
+        'guild': {'name': 'Test guild'},
+        'member': {'user': {'id': 'voter1', 'username': 'Voter'}, 'roles': []},
+        'data': {'name': 'vote', 'options': [{
+            'name': 'cast', 'type': 1, 'options': [{'name': 'candidate', 'type': 3, 'value': 'A'}]
+        }]}
+    }
+
+
+def content(response: dict) -> str:
+    return json.loads(response['body'])['data']['content']
+
+
+@pytest.mark.parametrize('store', ['memory', 'postgres'])
+def test_replayed_interaction_returns_the_first_response(dsn, server_id, make_election, monkeypatch, store):
+    monkeypatch.setenv('DATABASE_URL', dsn)
+    monkeypatch.setattr(index, 'DISCORD_DEFER_MODE', 'off')
+    monkeypatch.setattr(index, 'DISCORD_DEDUP_STORE', store)
+    monkeypatch.setattr(index, '_processed_interactions', OrderedDict())
+    make_election()
+    interaction = cast_interaction(server_id)
+
+    first = index.process_interaction_once(interaction, index.handle_discord_command)
+    assert content(first).startswith('✅')
+
+    if store == 'postgres':
+        # Повтор пришёл на другой экземпляр: в его памяти этого id нет
+        index._processed_interactions.clear()
+    replay = index.process_interaction_once(interaction, index.handle_discord_command)
+    # Повторное выполнение ответило бы «Вы уже проголосовали»
+    assert content(replay) == content(first)
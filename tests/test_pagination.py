@@ -0,0 +1,20 @@
+import index
+from conftest import ELECTION
+
+
+def test_elections_pages_keep_rows_sharing_created_at(conn, server_id):
+    # Одна пачка — одна транзакция — одинаковый created_at у всех строк
+    result = index.api_bulk_create_elections(conn, {'elections': [dict(ELECTION, serverId=server_id)] * 7})
+    created = {c['electionId'] for c in result['created']}
+    assert len(created) == 7
+
+    seen, cursor = [], None
+    while True:
+        page = index.api_get_elections(conn, server_id=server_id, limit='3', before=cursor)
+        seen += [e['id'] for e in page['elections']]
+        cursor = page['nextCursor']
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert set(seen) == created
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+import index
+
+
+def request(method: str, path: str, query: dict = None, body: dict = None) -> tuple:
+    response = index.handle_api_request({
+        'httpMethod': method, 'path': path, 'queryStringParameters': query, 'body': json.dumps(body or {})
+    })
+    return response['statusCode'], json.loads(response['body'])
+
+
+@pytest.mark.parametrize('method, path, query, body', [
+    ('GET', '/servers', {'limit': 'ten'}, None),
+    ('GET', '/servers', {'before': 'yesterday|server_1'}, None),
+    ('GET', '/elections/voters', {'election_id': 'election_1', 'after': '1e3'}, None),
+    ('GET', '/elections/changes', {'server_id': 'server_1', 'cursor': 'abc.1'}, None),
+    ('GET', '/elections/changes', {'server_id': 'server_1', 'cursor': '99999999999999999999.0'}, None),
+    ('POST', '/scheduler/tick', None, {'limit': 'all'}),
+])
+def test_malformed_limit_or_cursor_is_a_bad_request(dsn, monkeypatch, method, path, query, body):
+    monkeypatch.setenv('DATABASE_URL', dsn)
+    status, payload = request(method, path, query, body)
+    assert status == 400
+    assert 'error' in payload
+
+
+def test_limit_is_still_clamped_to_the_page_bounds():
+    assert index.parse_page_limit(None) == index.DEFAULT_PAGE_LIMIT
+    assert index.parse_page_limit('0') == 1
+    assert index.parse_page_limit('100000') == index.MAX_PAGE_LIMIT
@@ -0,0 +1,65 @@
+import index
+import tally
+from conftest import add_candidate
+
+
+def vote(conn, election_id: str, voters: range, ranking: list):
+    for voter in voters:
+        result = index.api_cast_vote(conn, {
+            'electionId': election_id, 'userId': f'voter{voter}', 'userName': f'Voter {voter}', 'ranking': ranking
+        })
+        assert result.get('success'), result
+
+
+def run_election(conn, make_election, method: str, seats: int, ballots) -> dict:
+    election_id, candidates = make_election(candidates='ABC', votingMethod=method, seats=seats, serverMemberCount=10)
+    # D регистрируется уже во время голосования и получает следующий номер при вставке
+    candidates['D'] = add_candidate(conn, election_id, 'D')
+
+    voter = 0
+    for count, names in ballots:
+        vote(conn, election_id, range(voter, voter + count), [candidates[n] for n in names])
+        voter += count
+    return index.api_complete_election(conn, election_id)
+
+
+def test_irv_transfers_ranked_preferences(conn, make_election):
+    result = run_election(conn, make_election, 'irv', 1, [(4, 'A'), (3, 'B'), (2, 'CB'), (3, 'D')])
+    assert result['winners'] == ['B']
+
+
+def test_mixed_ranking_keeps_first_preference_added_during_voting(conn, make_election):
+    # Под fptp и в итогах голос за D; ранжированный подсчёт не должен перенести его на A
+    result = run_election(conn, make_election, 'irv', 1, [(4, 'DA'), (3, 'A'), (2, 'B')])
+    assert result['winners'] == ['D']
+
+
+def test_ranking_with_unknown_or_repeated_candidate_is_rejected(conn, make_election):
+    election_id, candidates = make_election(votingMethod='irv')
+    a, b = candidates['A'], candidates['B']
+
+    def cast(ranking):
+        return index.api_cast_vote(conn, {'electionId': election_id, 'userId': 'voter', 'userName': 'Voter', 'ranking': ranking})
+
+    assert cast([a, 'candidate_missing'])['error'] == 'ranking contains unknown candidates'
+    assert cast([a, b, a])['error'] == 'ranking must not repeat candidates'
+    # Гонка с удалением кандидата после проверки: бюллетень отклоняется в базе, а не укорачивается
+    outcome = index.cast_vote(conn, 'voter', 'Voter', election_id=election_id, candidate_id=a, ranking=[a, 'candidate_missing'])
+    assert outcome['status'] == 'invalid_ranking'
+    assert cast([b, a]) == {'success': True}
+
+
+def test_stv_counts_candidate_registered_during_voting(conn, make_election):
+    result = run_election(conn, make_election, 'stv', 2, [(4, 'A'), (3, 'BA'), (5, 'D')])
+    assert sorted(result['winners']) == ['A', 'D']
+
+
+def test_parse_ballots_matches_reference():
+    values, weights = '3,0,-1,1,-1,-1,7,3,0', '2,1,5'
+    remap = {0: 2, 1: 0, 3: 1}
+    matrix, vectorized_weights = tally.parse_ballots(values, weights, 3, remap, vectorized=True)
+    rows, reference_weights = tally.parse_ballots(values, weights, 3, remap, vectorized=False)
+
+    assert matrix.tolist() == [[1, 2, -1], [0, -1, -1], [-1, 1, 2]]
+    assert rows == [[1, 2], [0], [1, 2]]
+    assert vectorized_weights.tolist() == reference_weights == [2.0, 1.0, 5.0]
@@ -0,0 +1,44 @@
+import json
+
+import index
+from conftest import ELECTION
+
+
+def cast(server_id: str, member_roles: list) -> str:
+    response = index.run_discord_command({
+        'type': 2,
+        'guild_id': server_id,
+        'guild': {'name': 'Test guild'},
+        'member': {'user': {'id': 'voter1', 'username': 'Voter'}, 'roles': member_roles},
+        'data': {'name': 'vote', 'options': [{
+            'name': 'cast', 'type': 1, 'options': [{'name': 'candidate', 'type': 3, 'value': 'cand1'}]
+        }]}
+    })
+    return json.loads(response['body'])['data']['content']
+
+
+def test_role_names_are_rejected_instead_of_failing_open(conn, server_id):
+    result = index.api_create_election(conn, dict(ELECTION, serverId=server_id, voterRoles=['@Участник']))
+    assert 'voterRoles' in result['error']
+
+    result = index.api_bulk_create_elections(conn, {'elections': [
+        dict(ELECTION, serverId=server_id, candidateRoles=['<@&123>', 'Активист']),
+        dict(ELECTION, serverId=server_id, candidateRoles=['<@&123>'], voterRoles=['456']),
+    ]})
+    assert [e['index'] for e in result['errors']] == [0]
+    assert [c['index'] for c in result['created']] == [1]
+
+
+def test_role_change_from_another_instance_applies_after_reload(conn, server_id, make_election):
+    election_id, _ = make_election(candidates=['cand1'], voterRoles=['111'])
+
+    assert 'нет роли' in cast(server_id, ['222'])
+
+    # Другой экземпляр меняет роли: здесь никакой инвалидации, только истечение кэша строки
+    cursor = conn.cursor()
+    cursor.execute("UPDATE elections SET voter_roles = %s WHERE id = %s", (['222'], election_id))
+    conn.commit()
+    cursor.close()
+    index.invalidate_active_elections(server_id)
+
+    assert cast(server_id, ['222']).startswith('✅')
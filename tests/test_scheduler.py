@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import psycopg2
+
+import index
+
+# Раньше любых других просроченных выборов в базе, чтобы тик с limit=1 брал именно эти
+DUE_AT = datetime(1990, 1, 1)
+
+
+def make_due(conn, election_id: str, lease_until: datetime = None):
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE elections SET registration_end_date = %s, transition_lease_until = %s WHERE id = %s",
+        (DUE_AT, lease_until, election_id)
+    )
+    conn.commit()
+    cursor.close()
+
+
+def status(conn, election_id: str) -> str:
+    cursor = conn.cursor()
+    cursor.execute("SELECT status FROM elections WHERE id = %s", (election_id,))
+    value = cursor.fetchone()[0]
+    cursor.close()
+    conn.rollback()
+    return value
+
+
+def test_tick_skips_locked_and_leased_rows_and_claims_due_ones(dsn, conn, make_election):
+    election_id, _ = make_election(status='registration')
+    tick_conn = psycopg2.connect(dsn, options='-c lock_timeout=2000')
+    try:
+        # Строку держит другой воркер: тик не ждёт её, а берёт следующую
+        make_due(conn, election_id)
+        locker = psycopg2.connect(dsn)
+        locker.cursor().execute("SELECT 1 FROM elections WHERE id = %s FOR UPDATE", (election_id,))
+        index.api_scheduler_tick(tick_conn, {'limit': 1})
+        locker.rollback()
+        locker.close()
+        assert status(conn, election_id) == 'registration'
+
+        # Аренда другого воркера ещё не истекла
+        make_due(conn, election_id, lease_until=datetime.now() + timedelta(minutes=5))
+        index.api_scheduler_tick(tick_conn, {'limit': 1})
+        assert status(conn, election_id) == 'registration'
+
+        # Истёкшая аренда возвращает выборы в очередь
+        make_due(conn, election_id, lease_until=datetime.now() - timedelta(minutes=5))
+        result = index.api_scheduler_tick(tick_conn, {'limit': 1})
+        assert (result['claimed'], result['transitions']['voting']) == (1, 1)
+        assert status(conn, election_id) == 'voting'
+    finally:
+        tick_conn.close()
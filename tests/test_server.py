@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+import index
+import server
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple:
+    '''Статус, заголовки и тело одного ответа; chunked-тело собирается целиком.'''
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) != b'\r\n':
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        body = b''
+        while size := int((await reader.readline()).strip(), 16):
+            body += await reader.readexactly(size)
+            await reader.readline()
+        await reader.readline()
+        return status, headers, body
+    return status, headers, await reader.readexactly(int(headers['content-length']))
+
+
+async def get(reader, writer, target: str) -> tuple:
+    writer.write(f'GET {target} HTTP/1.1\r\nHost: test\r\n\r\n'.encode())
+    await writer.drain()
+    return await read_response(reader)
+
+
+@pytest.fixture
+def app(dsn, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', dsn)
+    monkeypatch.setattr(server, 'SERVER_SHUTDOWN_TIMEOUT', 5)
+    yield server.HandlerServer(2, dsn)
+    index.close_db_pool()
+
+
+async def serve_and_drain(app, election_id: str) -> dict:
+    await app.start()
+    listening = await asyncio.start_server(app.handle_connection, '127.0.0.1', 0)
+    port = listening.sockets[0].getsockname()[1]
+    seen = {'pool_size': index.get_db_pool().maxconn}
+
+    # Два запроса подряд по одному соединению, второй — потоковая выгрузка
+    idle = await asyncio.open_connection('127.0.0.1', port)
+    seen['servers'] = await get(*idle, '/servers?limit=1')
+    seen['export'] = await get(*idle, f'/elections/voters/export?election_id={election_id}&format=ndjson')
+
+    busy = await asyncio.open_connection('127.0.0.1', port)
+    in_flight = asyncio.ensure_future(get(*busy, '/servers?limit=1&slow=1'))
+    await asyncio.sleep(0.1)
+    await app.shutdown(listening)
+
+    seen['in_flight'] = await in_flight
+    seen['idle_closed'] = await idle[0].read() == b''
+    return seen
+
+
+def test_keep_alive_chunked_export_and_drain(app, conn, make_election, monkeypatch):
+    election_id, candidates = make_election()
+    for voter in range(3):
+        index.api_cast_vote(conn, {'electionId': election_id, 'userId': f'v{voter}', 'userName': 'V', 'candidateId': candidates['A']})
+
+    followup_saw_pool = []
+
+    def followup():
+        time.sleep(0.3)
+        followup_saw_pool.append(index._db_pool is not None and not index._db_pool.closed)
+
+    list_servers = index.API_ROUTES[('GET', '/servers')]
+
+    def slow_servers(conn, query, *args):
+        if query.get('slow'):
+            index.get_followup_executor().submit(followup)
+            time.sleep(0.3)
+        return list_servers(conn, query, *args)
+
+    monkeypatch.setitem(index.API_ROUTES, ('GET', '/servers'), slow_servers)
+    seen = asyncio.run(serve_and_drain(app, election_id))
+
+    assert seen['pool_size'] >= 2 + index.DISCORD_FOLLOWUP_WORKERS
+    assert seen['servers'][0] == 200 and seen['servers'][1]['connection'] == 'keep-alive'
+    status, headers, body = seen['export']
+    assert (status, headers['transfer-encoding']) == (200, 'chunked')
+    assert len(body.splitlines()) == 3
+
+    # Начатый запрос доотвечен, простаивающее соединение закрыто, пул закрыт после отложенного ответа
+    assert seen['in_flight'][0] == 200 and seen['in_flight'][1]['connection'] == 'close'
+    assert seen['idle_closed']
+    assert followup_saw_pool == [True]
+    assert index._db_pool is None
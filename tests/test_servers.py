@@ -0,0 +1,78 @@
+import secrets
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+import index
+from bot_handler import _query_counter, counting_connection_class
+from conftest import delete_servers
+
+
+@pytest.fixture
+def make_servers(conn):
+    '''Создаёт count серверов с двумя администраторами каждый одной транзакцией.'''
+    created = []
+
+    def make(count: int) -> str:
+        prefix = f'test_{secrets.token_hex(4)}'
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO servers (id, name, member_count)
+            SELECT %(prefix)s || '_' || n, %(prefix)s || ' guild ' || n, 100 FROM generate_series(1, %(count)s) AS n
+            """,
+            {'prefix': prefix, 'count': count}
+        )
+        cursor.execute(
+            """
+            INSERT INTO bot_admins (server_id, user_id, user_name)
+            SELECT %(prefix)s || '_' || n, 'admin' || a, 'Admin ' || a
+            FROM generate_series(1, %(count)s) AS n, generate_series(1, 2) AS a
+            """,
+            {'prefix': prefix, 'count': count}
+        )
+        conn.commit()
+        cursor.close()
+        created.extend(f'{prefix}_{n}' for n in range(1, count + 1))
+        return prefix
+
+    yield make
+    conn.rollback()
+    delete_servers(conn, created)
+
+
+def count_queries(dsn: str, query: dict) -> tuple:
+    conn = psycopg2.connect(dsn, connection_factory=counting_connection_class(psycopg2.extensions.connection))
+    try:
+        _query_counter.count = 0
+        result = index.API_ROUTES[('GET', '/servers')](conn, query, {})
+        return _query_counter.count, result
+    finally:
+        conn.close()
+
+
+def test_servers_query_count_does_not_grow_with_servers(dsn, make_servers):
+    small, large = make_servers(15), make_servers(150)
+
+    small_queries, small_result = count_queries(dsn, {'search': small, 'limit': '200'})
+    large_queries, large_result = count_queries(dsn, {'search': large, 'limit': '200'})
+
+    assert len(small_result['servers']) == 15
+    assert len(large_result['servers']) == 150
+    assert all(len(s['botAdmins']) == 2 for s in large_result['servers'])
+    assert small_queries == large_queries == 1
+
+
+def test_servers_pages_keep_rows_sharing_added_at(conn, make_servers):
+    prefix = make_servers(7)
+
+    seen, cursor = [], None
+    while True:
+        page = index.api_get_servers(conn, search=prefix, limit='3', before=cursor)
+        seen += [s['id'] for s in page['servers']]
+        cursor = page['nextCursor']
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen)) == 7
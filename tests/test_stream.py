@@ -0,0 +1,112 @@
+import asyncio
+import json
+import time
+
+import psycopg2
+
+import stream
+
+
+def insert_change(dsn: str, server_id: str, election_id: str, kind: str):
+    conn = psycopg2.connect(dsn)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO election_changes (server_id, election_id, kind) VALUES (%s, %s, %s)",
+        (server_id, election_id, kind)
+    )
+    conn.commit()
+    conn.close()
+
+
+async def read_event(reader: asyncio.StreamReader) -> dict:
+    '''Следующее событие changes; пинги и служебные строки пропускаются.'''
+    event = None
+    while True:
+        line = (await reader.readline()).decode('utf-8').rstrip('\n')
+        if line.startswith('event: '):
+            event = line[len('event: '):]
+        elif line.startswith('data: ') and event == 'changes':
+            return json.loads(line[len('data: '):])
+
+
+async def stream_one_change(dsn: str, server_id: str, election_id: str, kind: str) -> dict:
+    listener = stream.ChangeListener(dsn)
+    await listener.start()
+    server = await asyncio.start_server(lambda r, w: stream.handle_connection(listener, r, w), '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET /elections/stream?server_id={server_id} HTTP/1.1\r\nHost: test\r\n\r\n'.encode())
+        await writer.drain()
+        assert (await reader.readline()).startswith(b'HTTP/1.1 200')
+        while not listener.subscribers.get(server_id):
+            await asyncio.sleep(0.01)
+
+        await asyncio.get_running_loop().run_in_executor(None, insert_change, dsn, server_id, election_id, kind)
+        return await asyncio.wait_for(read_event(reader), timeout=5)
+    finally:
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        listener.close()
+
+
+def test_status_change_is_pushed_through_notify(dsn, server_id):
+    event = asyncio.run(stream_one_change(dsn, server_id, 'election_a', 'status'))
+    assert event == {'elections': {'election_a': ['status']}}
+
+
+def test_vote_is_pushed_by_polling_without_notify(dsn, server_id):
+    event = asyncio.run(stream_one_change(dsn, server_id, 'election_b', 'vote'))
+    assert event == {'elections': {'election_b': ['vote']}}
+
+
+def test_listen_runs_off_the_event_loop(dsn, server_id, monkeypatch):
+    run = stream.ChangeListener._run
+
+    def slow_run(conn, statement):
+        time.sleep(0.3)
+        run(conn, statement)
+
+    monkeypatch.setattr(stream.ChangeListener, '_run', staticmethod(slow_run))
+
+    async def scenario():
+        listener = stream.ChangeListener(dsn)
+        await listener.start()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        try:
+            await listener.subscribe(server_id)
+        finally:
+            ticker.cancel()
+            listener.close()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
+
+
+def test_resubscribe_right_after_last_unsubscribe_keeps_listening(dsn, server_id):
+    async def scenario():
+        listener = stream.ChangeListener(dsn)
+        await listener.start()
+        try:
+            first = await listener.subscribe(server_id)
+            listener.unsubscribe(server_id, first)
+            second = await listener.subscribe(server_id)
+            # Отложенный UNLISTEN уже видит нового подписчика и ничего не делает
+            await asyncio.sleep(0.1)
+
+            await asyncio.get_running_loop().run_in_executor(None, insert_change, dsn, server_id, 'election_c', 'status')
+            await asyncio.wait_for(second.wakeup.wait(), timeout=5)
+            return second.drain()
+        finally:
+            listener.close()
+
+    assert asyncio.run(scenario()) == {'election_c': ['status']}
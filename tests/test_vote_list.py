@@ -0,0 +1,25 @@
+import json
+
+import index
+
+
+def list_candidates(server_id: str) -> str:
+    response = index.run_discord_command({
+        'type': 2,
+        'guild_id': server_id,
+        'guild': {'name': 'Test guild'},
+        'member': {'user': {'id': 'viewer', 'username': 'Viewer'}, 'roles': []},
+        'data': {'name': 'vote', 'options': [{'name': 'list', 'type': 1, 'options': []}]}
+    })
+    return json.loads(response['body'])['data']['embeds'][0]['description']
+
+
+def test_vote_invalidates_the_rendered_list(conn, server_id, make_election):
+    election_id, candidates = make_election()
+
+    assert '**1. A** (0 голосов)' in list_candidates(server_id)
+    assert election_id in index._rendered_lists
+
+    index.api_cast_vote(conn, {'electionId': election_id, 'userId': 'voter1', 'userName': 'Voter', 'candidateId': candidates['A']})
+    assert election_id not in index._rendered_lists
+    assert '**1. A** (1 голосов)' in list_candidates(server_id)
@@ -0,0 +1,28 @@
+import index
+
+
+def untallied(conn, election_id: str) -> int:
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM votes WHERE election_id = %s AND NOT tallied", (election_id,))
+    count = cursor.fetchone()[0]
+    cursor.close()
+    conn.rollback()
+    return count
+
+
+def test_reads_do_not_compact_and_the_scheduler_tick_does(conn, server_id, make_election, monkeypatch):
+    monkeypatch.setattr(index, 'TALLY_COMPACT_THRESHOLD', 2)
+    election_id, candidates = make_election()
+    for voter in range(3):
+        result = index.api_cast_vote(conn, {
+            'electionId': election_id, 'userId': f'voter{voter}', 'userName': f'Voter {voter}', 'candidateId': candidates['A']
+        })
+        assert result.get('success'), result
+
+    before = index.api_get_elections(conn, server_id=server_id)['elections'][0]
+    assert untallied(conn, election_id) == 3
+
+    assert index.api_scheduler_tick(conn, {})['compactedVotes'] >= 3
+    assert untallied(conn, election_id) == 0
+    after = index.api_get_elections(conn, server_id=server_id)['elections'][0]
+    assert after['candidates'] == before['candidates']
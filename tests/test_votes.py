@@ -0,0 +1,72 @@
+import json
+import threading
+
+import psycopg2
+
+import index
+
+
+def discord_cast(server_id: str, user_id: str, candidate: str) -> str:
+    response = index.run_discord_command({
+        'type': 2,
+        'guild_id': server_id,
+        'guild': {'name': 'Test guild'},
+        'member': {'user': {'id': user_id, 'username': user_id}, 'roles': []},
+        'data': {'name': 'vote', 'options': [{
+            'name': 'cast', 'type': 1, 'options': [{'name': 'candidate', 'type': 3, 'value': candidate}]
+        }]}
+    })
+    return json.loads(response['body'])['data']['content']
+
+
+def api_cast(conn, election_id: str, user_id: str, candidate_id: str) -> dict:
+    return index.api_cast_vote(conn, {'electionId': election_id, 'userId': user_id, 'userName': user_id, 'candidateId': candidate_id})
+
+
+def test_duplicate_vote_is_rejected_the_same_way_on_both_paths(conn, server_id, make_election):
+    election_id, candidates = make_election()
+
+    assert discord_cast(server_id, 'voter1', 'A').startswith('✅')
+    assert api_cast(conn, election_id, 'voter1', candidates['B']) == {'error': 'Already voted'}
+
+    assert api_cast(conn, election_id, 'voter2', candidates['B']) == {'success': True}
+    assert discord_cast(server_id, 'voter2', 'A') == '❌ Вы уже проголосовали'
+    assert discord_cast(server_id, 'voter1', 'B') == '❌ Вы уже проголосовали'
+
+
+def test_concurrent_batch_rejects_only_the_duplicate_ballot(dsn, conn, make_election, monkeypatch):
+    election_id, candidates = make_election()
+    monkeypatch.setattr(index, 'VOTE_BATCH_WINDOW_MS', 300)
+    monkeypatch.setattr(index, '_vote_batcher', index.VoteBatcher(300, 500))
+    batches = []
+    cast_votes = index.cast_votes
+    monkeypatch.setattr(index, 'cast_votes', lambda c, ballots: batches.append(len(ballots)) or cast_votes(c, ballots))
+
+    ballots = [('voter0', 'A'), ('voter1', 'B'), ('voter0', 'B'), ('voter2', 'A')]
+    results = [None] * len(ballots)
+    barrier = threading.Barrier(len(ballots))
+
+    def cast(slot: int):
+        own = psycopg2.connect(dsn)
+        try:
+            barrier.wait()
+            user_id, name = ballots[slot]
+            results[slot] = api_cast(own, election_id, user_id, candidates[name])
+        finally:
+            own.close()
+
+    threads = [threading.Thread(target=cast, args=(slot,)) for slot in range(len(ballots))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert batches == [len(ballots)]
+    assert sorted(results[i] == {'success': True} for i in (0, 2)) == [False, True]
+    assert {'error': 'Already voted'} in (results[0], results[2])
+    assert results[1] == results[3] == {'success': True}
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM votes WHERE election_id = %s", (election_id,))
+    assert cursor.fetchone()[0] == 3
+    cursor.close()
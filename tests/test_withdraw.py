@@ -0,0 +1,21 @@
+import json
+
+import index
+
+
+def test_withdraw_with_a_stale_cache_keeps_the_candidate(conn, server_id, make_election):
+    election_id, candidates = make_election(status='registration', candidates=['user1'])
+    assert index.find_active_election(conn, server_id, ('registration',))
+
+    # Голосование началось на другом экземпляре; здесь кэш ещё считает, что идёт регистрация
+    cursor = conn.cursor()
+    cursor.execute("UPDATE elections SET status = 'voting' WHERE id = %s", (election_id,))
+    conn.commit()
+
+    response = index.discord_withdraw(conn, server_id, 'user1')
+    assert json.loads(response['body'])['data']['content'] == '❌ Сейчас не проводится регистрация'
+    assert server_id not in index._active_elections_cache
+
+    cursor.execute("SELECT COUNT(*) FROM candidates WHERE id = %s", (candidates['user1'],))
+    assert cursor.fetchone()[0] == 1
+    cursor.close()